@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+
+# Row counts per category of a categorical column, in category order
+def category_counts(column):
+    codes = column.cat.codes.to_numpy()
+    return np.bincount(codes[codes >= 0], minlength=len(column.cat.categories))
+
+# Median of values per category with a single sort: rows are ordered by (code, value) and the
+# middle element(s) of every group are picked by offset. counts comes from category_counts.
+def grouped_median(column, values, counts):
+    codes = column.cat.codes.to_numpy()
+    values = values.to_numpy()
+    valid = codes >= 0
+    codes, values = codes[valid], values[valid]
+    sorted_values = values[np.lexsort((values, codes))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+    lower = (starts + (counts - 1) // 2)[present]
+    upper = (starts + counts // 2)[present]
+    medians = np.full(len(counts), np.nan)
+    medians[present] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians
+
+# Box plot statistics (Tukey fences at 1.5 IQR), so the figure carries a handful of numbers
+# instead of every price. At most max_outliers evenly spaced outliers are kept as samples.
+def box_stats(values, max_outliers=0):
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    stats = {
+        "q1": float(q1),
+        "median": float(median),
+        "q3": float(q3),
+        "lowerfence": float(values[inside].min()),
+        "upperfence": float(values[inside].max()),
+        "outliers": [],
+    }
+    if max_outliers > 0:
+        outliers = np.sort(values[~inside])
+        if len(outliers) > max_outliers:
+            outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).astype(int)]
+        stats["outliers"] = outliers.tolist()
+    return stats
+
+def _present(column, counts):
+    series = pd.Series(counts, index=column.cat.categories.astype(str))
+    return series[series > 0]
+
+# Everything the dashboard shows, computed once from the filtered rows
+def summarize(dff):
+    summary = {"count": len(dff)}
+    if len(dff) == 0:
+        return summary
+    price = dff["Price"].to_numpy()
+    price_box = box_stats(price)
+    location_counts = category_counts(dff["Location"])
+    regions = pd.DataFrame({
+        "listing_count": location_counts,
+        "median_price": grouped_median(dff["Location"], dff["Price_M2"], location_counts),
+    }, index=dff["Location"].cat.categories.astype(str))
+    summary.update({
+        "price_min": int(price.min()),
+        "price_max": int(price.max()),
+        "price_median": price_box["median"],
+        "size_mean": float(dff["Size"].to_numpy().mean()),
+        "price_m2_median": float(np.median(dff["Price_M2"].to_numpy())),
+        "year_median": float(np.median(dff["Year"].to_numpy())),
+        "types": _present(dff["Type"], category_counts(dff["Type"])),
+        "rooms": _present(dff["Rooms"], category_counts(dff["Rooms"])),
+        "regions": regions[regions["listing_count"] > 0],
+        "price_box": price_box,
+    })
+    return summary
@@ -1,65 +1,53 @@
 from dash import Dash, html, dcc
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output, State
 from dash.exceptions import PreventUpdate
 import plotly.express as px
-import pandas as pd
 import numpy as np
 import plotly.graph_objs as go
+import plotly.io as pio
 import math
 import dash_extensions as de
 import dash_leaflet as dl
 from urllib.request import urlopen
 from dash_extensions.javascript import Namespace, arrow_function
-import geopandas as gpd
-import json
+from functools import lru_cache
+import os
+import uuid
+from aggregate import summarize
+from title_index import tokenize
+from snapshot import Reloader, load_snapshot
+from regions import GEOMETRY_DIR, geometry_levels, geometry_url, init_app as init_regions, region_hideout
+from figure_cache import FigureCache, backend_from_env
+from metrics import init_app as init_metrics, instrument, record_rows
+from clientside import clientside_payload
+from callback_pool import CallbackPool
 
 app = Dash(__name__)
 server = app.server
 app.title = "Housing analysis"
+# Callback timings, rows and response sizes, served at /metrics
+init_metrics(app)
+# plotly imports its JSON engine (orjson when installed) on the first response, concurrent first
+# responses can see it half-imported. Serializing once here imports it before any request.
+pio.json.to_json_plotly({})
 
-# Load the data, drop records with empty fields, convert num data to int and sort by price
-df = pd.read_csv("full_data_cleaned_and_outliers_removed.csv", sep=",")
-df.dropna(subset=["Price", "Rooms", "Size", "Type", "Year"], inplace=True)
-# Ahvenanmaa has to be dropped, because the geojson for the map doesn't contain it and thus can't visualize it
-df.drop(df[df["Location"] == "Ahvenanmaa"].index, inplace=True)
-df = df.astype({"Price": "int", "Year": "int", "Size": "int"})
-df = df.sort_values(by=["Price"])
-
-# Translate house types & regions from Finnish to English
-df["Type"] = df["Type"].str.replace("Kerrostalo", "Apartment").replace("Omakotitalo", "House").replace("Rivitalo", "Rowhouse").replace("Luhtitalo", "Loft")
-df["Rooms"] = df["Rooms"].str.replace("1H", "1R").replace("2H", "2R").replace("3H", "3R").replace("4H", "4R").replace("5H", "5R").replace("6H", "6R")
-# The regions are translated manually, because of the differences between tori and geojson naming conventions
-df = df.replace({"Location" : {"Etelä-Karjala" : "South Karelia", "Etelä-Pohjanmaa" : "Southern Ostrobothnia", "Etelä-Savo" : "Southern Savonia", 
-"Kainuu" : "Kainuu", "Kanta-Häme" : "Tavastia Proper", "Keski-Pohjanmaa" : "Central Ostrobothnia", "Keski-Suomi" : "Central Finland",
- "Kymenlaakso" : "Kymenlaakso", "Lappi" : "Lapland", "Pirkanmaa" : "Pirkanmaa", "Pohjanmaa" : "Ostrobothnia", "Pohjois-Karjala" : "North Karelia", 
- "Pohjois-Pohjanmaa" : "Northern Ostrobothnia", "Pohjois-Savo" : "Northern Savonia", "Päijät-Häme" : "Päijät-Häme", "Satakunta" : "Satakunta",
- "Uusimaa" : "Uusimaa", "Varsinais-Suomi" : "Finland Proper"}})
-# Create a new column, "Price_M2", which calculates €/m² for every row
-df["Price_M2"] = df.apply(lambda row: row.Price / row.Size, axis=1)
-
-
-# Support variables for callback functions
-housing_types = np.sort(df["Type"].unique())
-locations = np.sort(df["Location"].unique())
-rooms = np.sort(df["Rooms"].unique())
+# Load the compiled dataset (see dataset.py), or clean the CSV if it hasn't been compiled.
+# The snapshot holds the data, its indexes and the full dataset figures, see snapshot.py
+DATA_CSV = os.environ.get("DATA_CSV", "full_data_cleaned_and_outliers_removed.csv")
+DATA_ARTIFACT = os.environ.get("DATA_ARTIFACT", "compiled")
+snapshot = load_snapshot(DATA_CSV, DATA_ARTIFACT)
+# With CLIENTSIDE_FILTERING=1 the listings are sent to the browser once and filtered there
+CLIENTSIDE_FILTERING = os.environ.get("CLIENTSIDE_FILTERING", "0") == "1"
 
 # Map
 #finland_url = "https://raw.githubusercontent.com/ufoe/d3js-geojson/master/Finland.json"
-with open("Finland.json") as response:
-    finland = json.load(response)
+# The region geometry is served once as a static file (see regions.py), updates only restyle it
+init_regions(app)
 
 # Lottie
 lottie_url = "https://assets9.lottiefiles.com/packages/lf20_v7lgcy3m.json"
 lottie_options = dict(loop=False, autoplay=True)
 
-# Dataset figures
-ttl_median_size = math.floor(df.Size.mean())
-ttl_median_euro_m2 = math.floor(df["Price_M2"].median())
-ttl_median_year = math.floor(df.Year.median())
-ttl_cheapest_listing = df.Price.min()
-ttl_most_expensive_listing = df.Price.max()
-ttl_median_price = df.Price.median()
-
 # Support functions
 def percentage(part, whole):
   percentage = math.floor(100 * float(part)/float(whole))
@@ -71,8 +59,8 @@ def percentage(part, whole):
   if percentage == 0:
     return f"-"
 
-def year_comparison(year):
-    diff = year - ttl_median_year
+def year_comparison(year, median_year):
+    diff = year - median_year
     if diff > 0:
         return html.Div(className="year-test-pos", children=f"+{diff}")
     if diff < 0:
@@ -80,184 +68,296 @@ def year_comparison(year):
     if diff == 0:
         return f"-"
 
-app.layout = html.Div(className="my-dash-app", children=[
-    # Store
-    dcc.Store(id="memory-output"),
-
-    # Header
-    html.Div(className="header row", children=[
-        html.Div(id="lottie-wrapper", children=[de.Lottie(options=lottie_options,
-                 width="75%", height="75%", url=lottie_url, className="header-lottie"), ]),
-        html.Span(id="header-title", children=" Housing Analysis"),
-    ]),
-
-    # Options
-    html.Div(className="flexbox-container row", children=[
-        # Hoverable info panel
-        html.Div(className="flexbox-item flexbox-item-1", children=[
-            html.Div(className="info-tooltip", children=[
-                html.Div(className="info-text tooltip", children=[
-                    html.Span(className="info-text-i", children="i"),
-                    html.Span(className="tooltiptext", children="""This application contains data from over 5000 housing listings from a Finnish peer-to-peer marketplace, Tori.fi. You can query the data with various options and the resulting data will be visualized below!""")])
-            ])
-        ]),
-        html.Div(className="flexbox-item flexbox-item-2", children=[
-        html.Label(children="Type:"),
-            dcc.Dropdown(
-                id="housing-type-dropdown",
-                options=[{"label": x, "value": x} for x in housing_types],
-                placeholder="House type",
-                multi=True,
-            ),
-        ]),
-        html.Div(className="flexbox-item flexbox-item-3", children=[
-            html.Label("Location:"),
-            dcc.Dropdown(
-                id="location-dropdown",
-                options=[{"label": x, "value": x} for x in locations],
-                placeholder="Region",
-                multi=True
-            ),
-        ]),
-        html.Div(className="flexbox-item flexbox-item-4", children=[
-            html.Label(id="price-label", children="Price (€):"),
-            dcc.RangeSlider(
-                id="price-slider",
-                className="dbc",
-                min=df.Price.min(),
-                max=df.Price.max(),
-                value=[df.Price.min(), df.Price.max()],
-                step=5000,
-                marks=None,
-                tooltip={"placement": "bottom", "always_visible": True},
-            ),
-        ]),
-        html.Div(className="flexbox-item flexbox-item-5", children=[
-            html.Label(id="year-label", children="Year:"),
-            dcc.RangeSlider(
-                id="year-slider",
-                className="dbc",
-                min=df.Year.min(),
-                max=df.Year.max(),
-                value=[df.Year.min(), df.Year.max()],
-                step=1,
-                marks=None,
-                tooltip={"placement": "bottom", "always_visible": True}
-            ),
-        ]),
-        html.Div(className="flexbox-item flexbox-item-6", children=[
-        html.Label(id="size-label", children="Size (m²):"),
-            dcc.RangeSlider(
-                id="size-slider",
-                className="dbc",
-                min=df.Size.min(),
-                max=df.Size.max(),
-                value=[df.Size.min(), df.Size.max()],
-                step=1,
-                marks=None,
-                tooltip={"placement": "bottom", "always_visible": True}
-            ),
-        ]),
-        html.Div(className="flexbox-item flexbox-item-7", children=[
-            html.Label("Rooms"),
-            dcc.Dropdown(
-                id="rooms-dropdown",
-                options=[{"label": x, "value": x} for x in rooms],
-                placeholder="Room count",
-                multi=True
-            )
-        ]),
-    ]),
-    html.Hr(className=""),
-    html.Div(className="grid-container", children=[
-        html.Div(className="grid-item grid-item-1", children=[
-            html.Div(id="key-figures", className="keyfig-container")
-        ]),
-        # html.Div(className="grid-item grid-item-2", children=[
-        #     html.P("")
-        # ]),
-        html.Div(className="grid-item grid-item-3", children=[
-            html.Div(id="listings-count", className="listcount")
-        ]),
-        html.Div(className="grid-item grid-item-4", children=[
-            html.Div(className="grid-title", children="Median €/m² by region"),
-            dcc.Graph(id="price-m2-median-by-loc")
-        ]),
-        html.Div(className="grid-item grid-item-5", children=[
-            html.Div(className="map-container", children=[
-                # dcc.Graph(id="count-map")
-                html.Div(id="count-map")
-            ])
-        ]),
-        html.Div(className="grid-item grid-item-6", children=[
-            html.P("")
-        ]),
-        html.Div(className="grid-item grid-item-7", children=[
-            html.Div(className="grid-title", children="Price distribution"),
-            dcc.Graph(id="price-distrib")
-        ]),
-        html.Div(className="grid-item grid-item-8", children=[
-            html.Div(className="grid-title", children="Distribution of types"),
-            dcc.Graph(id="types-pie")
-        ]),
-        html.Div(className="grid-item grid-item-9", children=[
-            html.Div(className="grid-title", children="Distribution of rooms"),
-            dcc.Graph(id="rooms-pie")
-        ]),
-    ]),
-    html.Footer(className="footer row", children=[
-        html.A(href="https://github.com/tonimobin/tori-housing-analysis", target="_blank", children=[
-            html.Img(className="footer-icon footer-icon-gh", src=app.get_asset_url("github-logo-small.png")),
+# The memory-output store only holds a query handle (the normalized filter selections),
+# the matching rows are looked up from the in-process df by each callback
+def make_query_handle(housing_type_dropdown, location_dropdown, price_slider, year_slider,
+                      size_slider, rooms_dropdown, title_search=None):
+    return {
+        "type": sorted(housing_type_dropdown) if housing_type_dropdown else [],
+        "location": sorted(location_dropdown) if location_dropdown else [],
+        "rooms": sorted(rooms_dropdown) if rooms_dropdown else [],
+        "price": [int(price_slider[0]), int(price_slider[1])],
+        "year": [int(year_slider[0]), int(year_slider[1])],
+        "size": [int(size_slider[0]), int(size_slider[1])],
+        # Title search words in a canonical order, see title_index.tokenize
+        "search": " ".join(sorted(set(tokenize(title_search or "")))),
+    }
+
+# Slider ranges are clamped to the data bounds, so equivalent selections share one key.
+# The dataset version is part of the key, results of a previous dataset are never reused.
+def clamp_range(values, bounds):
+    low, high = bounds
+    return (max(values[0], low), min(values[1], high))
+
+def handle_key(handle, snap):
+    return (snap.version, tuple(handle["type"]), tuple(handle["location"]), tuple(handle["rooms"]),
+            clamp_range(handle["price"], snap.bounds["Price"]), clamp_range(handle["year"], snap.bounds["Year"]),
+            clamp_range(handle["size"], snap.bounds["Size"]), handle.get("search", ""))
+
+# The filtered frame is memoized and computed once per filter change. Callers must treat the returned frame as read-only.
+def query_args(key):
+    _, types, locations, rooms, price, year, size, _ = key
+    return {"ranges": {"Year": year, "Price": price, "Size": size},
+            "categories": {"Rooms": rooms, "Type": types, "Location": locations}}
+
+@lru_cache(maxsize=32)
+def _filter_rows(snap, key):
+    rows = snap.engine.query(**query_args(key))
+    search = key[-1]
+    if search and snap.title_index is not None:
+        matches = snap.title_index.search(search)
+        if len(rows) == len(snap.df):
+            rows = matches
+        else:
+            # Both are ascending, a lookup table of the matches keeps the order of rows
+            matched = np.zeros(len(snap.df), dtype=bool)
+            matched[matches] = True
+            rows = rows[matched[rows]]
+    return snap.df.iloc[rows]
+
+def filtered_rows(handle, snap):
+    return _filter_rows(snap, handle_key(handle, snap))
+
+# Figure results shared between sessions, keyed by the canonical filter key
+figure_cache = FigureCache(backend_from_env(), key_func=lambda snap, handle: handle_key(handle, snap))
+
+# Swap in a freshly loaded dataset, requests already running finish on the old snapshot
+def swap_snapshot(new_snapshot):
+    global snapshot
+    snapshot = new_snapshot
+    _filter_rows.cache_clear()
+    _summary.cache_clear()
+    figure_cache.clear()
+
+# The summaries and figures are computed on a bounded thread pool, see callback_pool.py
+callback_pool = None
+
+# Check for a new dataset every DATA_RELOAD_INTERVAL seconds (0 disables reloading)
+reload_interval = float(os.environ.get("DATA_RELOAD_INTERVAL", "60"))
+
+# Threads don't survive a fork. gunicorn.conf.py preloads the app in the master, so the workers
+# share the snapshot copy-on-write, and starts the pool & the reloader in every worker from its
+# post_fork hook. Anywhere else they are started on import.
+def start_background_threads():
+    global callback_pool
+    callback_pool = CallbackPool()
+    if reload_interval > 0:
+        Reloader(DATA_CSV, DATA_ARTIFACT, snapshot.version, swap_snapshot, reload_interval).start()
+
+if os.environ.get("START_THREADS_POST_FORK") != "1":
+    start_background_threads()
+
+@server.route("/cache-stats")
+def cache_stats():
+    return figure_cache.stats()
+
+# Map, part of the layout. The geometry level follows the zoom, the callbacks only update the hideout.
+def region_map():
+    ns = Namespace("myNamespace", "mySubNamespace")
+    hover_style = dict(weight=6, fillColor="#57cf36", fillOpacity=0.3)
+    geoj = dl.GeoJSON(id="region-geojson", url=geometry_url(6), hideout=dict(counts={}, medians={}, max_count=0),
+                      hoverStyle=arrow_function(hover_style),
+                      options=dict(pointToLayer=ns("pointToLayer"), style=ns("regionStyle"), onEachFeature=ns("regionTooltip")))
+    return [
+        html.Div(className="map-title", children="Listings & median €/m² by region"),
+        dl.Map([geoj, dl.TileLayer()], id="region-map", center=(61.5, 25), zoom=6, style={"height" : "310px"}),
+        dcc.Store(id="region-geometry-levels", data=geometry_levels(GEOMETRY_DIR)),
+    ]
+
+# The layout is built per page load, so the options and slider bounds follow the current dataset
+def serve_layout():
+    snap = snapshot
+    return html.Div(className="my-dash-app", children=[
+        # Store
+        dcc.Store(id="memory-output"),
+        # Identifies the page load and numbers its filter changes, so a newer request can supersede
+        # an older one of the same session even when they reach the server out of order
+        dcc.Store(id="session-id", data=uuid.uuid4().hex),
+        dcc.Store(id="request-seq"),
+        dcc.Store(id="listings-columns", data=clientside_payload(snap) if CLIENTSIDE_FILTERING else None),
+
+        # Header
+        html.Div(className="header row", children=[
+            html.Div(id="lottie-wrapper", children=[de.Lottie(options=lottie_options,
+                     width="75%", height="75%", url=lottie_url, className="header-lottie"), ]),
+            html.Span(id="header-title", children=" Housing Analysis"),
         ]),
-        html.A(href="https://studies.helsinki.fi/courses/cur/hy-opt-cur-2122-f77f1644-2bfe-4693-a6bb-47596553c0c4/Interactive_Data_Visualization_Lectures",
-        target="_blank", children=[
-            html.Img(className="footer-icon footer-icon-hy", src=app.get_asset_url("hy-logo-small.png")),
+
+        # Options
+        html.Div(className="flexbox-container row", children=[
+            # Hoverable info panel
+            html.Div(className="flexbox-item flexbox-item-1", children=[
+                html.Div(className="info-tooltip", children=[
+                    html.Div(className="info-text tooltip", children=[
+                        html.Span(className="info-text-i", children="i"),
+                        html.Span(className="tooltiptext", children="""This application contains data from over 5000 housing listings from a Finnish peer-to-peer marketplace, Tori.fi. You can query the data with various options and the resulting data will be visualized below!""")])
+                ])
+            ]),
+            html.Div(className="flexbox-item flexbox-item-2", children=[
+            html.Label(children="Type:"),
+                dcc.Dropdown(
+                    id="housing-type-dropdown",
+                    options=[{"label": x, "value": x} for x in snap.housing_types],
+                    placeholder="House type",
+                    multi=True,
+                ),
+            ]),
+            html.Div(className="flexbox-item flexbox-item-3", children=[
+                html.Label("Location:"),
+                dcc.Dropdown(
+                    id="location-dropdown",
+                    options=[{"label": x, "value": x} for x in snap.locations],
+                    placeholder="Region",
+                    multi=True
+                ),
+            ]),
+            html.Div(className="flexbox-item flexbox-item-4", children=[
+                html.Label(id="price-label", children="Price (€):"),
+                dcc.RangeSlider(
+                    id="price-slider",
+                    className="dbc",
+                    min=snap.bounds["Price"][0],
+                    max=snap.bounds["Price"][1],
+                    value=list(snap.bounds["Price"]),
+                    step=5000,
+                    marks=None,
+                    tooltip={"placement": "bottom", "always_visible": True},
+                ),
+            ]),
+            html.Div(className="flexbox-item flexbox-item-5", children=[
+                html.Label(id="year-label", children="Year:"),
+                dcc.RangeSlider(
+                    id="year-slider",
+                    className="dbc",
+                    min=snap.bounds["Year"][0],
+                    max=snap.bounds["Year"][1],
+                    value=list(snap.bounds["Year"]),
+                    step=1,
+                    marks=None,
+                    tooltip={"placement": "bottom", "always_visible": True}
+                ),
+            ]),
+            html.Div(className="flexbox-item flexbox-item-6", children=[
+            html.Label(id="size-label", children="Size (m²):"),
+                dcc.RangeSlider(
+                    id="size-slider",
+                    className="dbc",
+                    min=snap.bounds["Size"][0],
+                    max=snap.bounds["Size"][1],
+                    value=list(snap.bounds["Size"]),
+                    step=1,
+                    marks=None,
+                    tooltip={"placement": "bottom", "always_visible": True}
+                ),
+            ]),
+            html.Div(className="flexbox-item flexbox-item-7", children=[
+                html.Label("Rooms"),
+                dcc.Dropdown(
+                    id="rooms-dropdown",
+                    options=[{"label": x, "value": x} for x in snap.rooms],
+                    placeholder="Room count",
+                    multi=True
+                )
+            ]),
+            # Title search needs the server, it isn't offered in the clientside mode
+            html.Div(className="flexbox-item flexbox-item-8", children=[
+                html.Label("Search"),
+                dcc.Input(
+                    id="title-search",
+                    className="title-search",
+                    type="search",
+                    placeholder="Street, district...",
+                    debounce=True,
+                )
+            ]) if not CLIENTSIDE_FILTERING else None,
         ]),
-        html.A(href="https://www.tori.fi/",
-        target="_blank", children=[
-            html.Img(className="footer-icon footer-icon-hy", src=app.get_asset_url("tori-logo-small.png")),
+        html.Hr(className=""),
+        html.Div(className="grid-container", children=[
+            html.Div(className="grid-item grid-item-1", children=[
+                html.Div(id="key-figures", className="keyfig-container")
+            ]),
+            # html.Div(className="grid-item grid-item-2", children=[
+            #     html.P("")
+            # ]),
+            html.Div(className="grid-item grid-item-3", children=[
+                html.Div(id="listings-count", className="listcount")
+            ]),
+            html.Div(className="grid-item grid-item-4", children=[
+                html.Div(className="grid-title", children="Median €/m² by region"),
+                dcc.Graph(id="price-m2-median-by-loc")
+            ]),
+            html.Div(className="grid-item grid-item-5", children=[
+                html.Div(className="map-container", children=[
+                    # dcc.Graph(id="count-map")
+                    html.Div(id="count-map", children=region_map())
+                ])
+            ]),
+            html.Div(className="grid-item grid-item-6", children=[
+                html.P("")
+            ]),
+            html.Div(className="grid-item grid-item-7", children=[
+                html.Div(className="grid-title", children="Price distribution"),
+                dcc.Graph(id="price-distrib")
+            ]),
+            html.Div(className="grid-item grid-item-8", children=[
+                html.Div(className="grid-title", children="Distribution of types"),
+                dcc.Graph(id="types-pie")
+            ]),
+            html.Div(className="grid-item grid-item-9", children=[
+                html.Div(className="grid-title", children="Distribution of rooms"),
+                dcc.Graph(id="rooms-pie")
+            ]),
         ]),
+        html.Footer(className="footer row", children=[
+            html.A(href="https://github.com/tonimobin/tori-housing-analysis", target="_blank", children=[
+                html.Img(className="footer-icon footer-icon-gh", src=app.get_asset_url("github-logo-small.png")),
+            ]),
+            html.A(href="https://studies.helsinki.fi/courses/cur/hy-opt-cur-2122-f77f1644-2bfe-4693-a6bb-47596553c0c4/Interactive_Data_Visualization_Lectures",
+            target="_blank", children=[
+                html.Img(className="footer-icon footer-icon-hy", src=app.get_asset_url("hy-logo-small.png")),
+            ]),
+            html.A(href="https://www.tori.fi/",
+            target="_blank", children=[
+                html.Img(className="footer-icon footer-icon-hy", src=app.get_asset_url("tori-logo-small.png")),
+            ]),
+        ])
     ])
-])
+
+app.layout = serve_layout
 
 # Handle updates to data when user makes different queries
-@app.callback(
-    Output("memory-output", "data"),
-    Input('housing-type-dropdown', 'value'),
-    Input('location-dropdown', 'value'),
-    Input('price-slider', 'value'),
-    Input('year-slider', 'value'),
-    Input('size-slider', 'value'),
-    Input('rooms-dropdown', 'value'))
+@instrument("filter_data")
 def filter_data(housing_type_dropdown, location_dropdown, price_slider, year_slider,
-                size_slider, rooms_dropdown):
+                size_slider, rooms_dropdown, title_search=None, seq=None):
+    # Only builds the handle, the rows are resolved by the dashboard callback
+    handle = make_query_handle(housing_type_dropdown, location_dropdown, price_slider, year_slider,
+                               size_slider, rooms_dropdown, title_search)
+    return dict(handle, seq=seq)
 
-    # Filter data by slider values
-    dff = df[df['Year'].between(year_slider[0], year_slider[1], inclusive="both")]
-    dff = dff[dff['Price'].between(price_slider[0], price_slider[1], inclusive="both")]
-    dff = dff[dff['Size'].between(size_slider[0], size_slider[1], inclusive="both")]
+# Summaries of the filtered rows, shared by every output of the dashboard callback. Large
+# selections are merged from the aggregate cube (see cube.py), small ones summarized exactly.
+@lru_cache(maxsize=32)
+def _summary(snap, key):
+    # The cube has no titles, title searches are always summarized from their rows
+    summary = snap.cube.summarize(**query_args(key)) if snap.cube is not None and not key[-1] else None
+    if summary is None:
+        summary = summarize(_filter_rows(snap, key))
+    return summary
 
-    # Filter data by checklist selections
-    if rooms_dropdown:
-        dff = dff[dff["Rooms"].isin(rooms_dropdown)]
+def dashboard_summary(handle, snap):
+    return _summary(snap, handle_key(handle, snap))
 
-    # Filter data by dropdown selections
-    if housing_type_dropdown:
-        dff = dff[dff["Type"].isin(housing_type_dropdown)]
-    if location_dropdown:
-        dff = dff[dff["Location"].isin(location_dropdown)]
+def empty_figure():
+    figure = go.Figure(data=[])
+    figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
+    figure.update_xaxes(visible=False)
+    figure.update_yaxes(visible=False)
+    return figure
 
-    return dff.to_dict("records")
-
-# # Update median price by size (horizontal bar chart)
-@app.callback(Output("price-m2-median-by-loc", "figure"), Input("memory-output", "data"))
-def update_price_horizontal(data):
-    if data is None:
-        raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        location_grp = df.groupby("Location")
-        dff = location_grp["Price_M2"].median().round(0)
+# # Median price by size (horizontal bar chart)
+def price_horizontal_figure(summary):
+    if summary["count"] > 0:
+        dff = summary["regions"]["median_price"].round(0)
         dff = dff.reset_index()
         dff.columns = ["Location", "€/m²"]
         dff = dff.sort_values("€/m²", ascending=False)
@@ -267,26 +367,17 @@ def update_price_horizontal(data):
         figure.update_xaxes(showticklabels=False)
         return figure
     else:
-        figure = go.Figure(data=[])
-        figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
-        figure.update_xaxes(visible=False)
-        figure.update_yaxes(visible=False)
-        return figure
+        return empty_figure()
 
-# Create & update keyfigures
-@app.callback(Output("key-figures", "children"), Input("memory-output", "data"))
-def update_keyfig(data):
-    if data is None:
-        raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        median_size = math.floor(df.Size.mean())
-        # median_euro_m2 = math.floor(df.Price.sum() / df.Size.sum())
-        median_euro_m2 = math.floor(df["Price_M2"].median())
-        median_year = math.floor(df.Year.median())
-        cheapest_listing = df.Price.min()
-        most_expensive_listing = df.Price.max()
-        median_price = math.floor(df.Price.median())
+# Key figures
+def keyfig_children(summary, snap):
+    if summary["count"] > 0:
+        median_size = math.floor(summary["size_mean"])
+        median_euro_m2 = math.floor(summary["price_m2_median"])
+        median_year = math.floor(summary["year_median"])
+        cheapest_listing = summary["price_min"]
+        most_expensive_listing = summary["price_max"]
+        median_price = math.floor(summary["price_median"])
         return [
             html.Div(className="keyfig-tooltip", children=[
                 html.Div(className="info-text tooltip", children=[
@@ -302,9 +393,9 @@ def update_keyfig(data):
                     html.Div(className="values-item", children=f"{median_size} m²"),
                     html.Div(className="values-item", children="{:,} €".format(median_euro_m2).replace(",", " ")),
                     html.Div(className="values-item", children=f"{median_year}"),
-                    html.Div(className="values-item keyfig-percent", children=[percentage(median_size, ttl_median_size)]),
-                    html.Div(className="values-item keyfig-percent", children=[percentage(median_euro_m2, ttl_median_euro_m2)]),
-                    html.Div(className="values-item keyfig-percent", children=[year_comparison(median_year)])
+                    html.Div(className="values-item keyfig-percent", children=[percentage(median_size, snap.ttl_median_size)]),
+                    html.Div(className="values-item keyfig-percent", children=[percentage(median_euro_m2, snap.ttl_median_euro_m2)]),
+                    html.Div(className="values-item keyfig-percent", children=[year_comparison(median_year, snap.ttl_median_year)])
             ]),
             html.Div(className="keyfig-row keyfig-row-2", children=[
                     html.Div(className="labels-item", children="Cheapest listing"),
@@ -313,9 +404,9 @@ def update_keyfig(data):
                     html.Div(className="values-item", children="{:,} €".format(cheapest_listing).replace(",", " ")),
                     html.Div(className="values-item", children="{:,} €".format(most_expensive_listing).replace(",", " ")),
                     html.Div(className="values-item", children="{:,} €".format(median_price).replace(",", " ")),
-                    html.Div(className="values-item keyfig-percent", children=[percentage(cheapest_listing, ttl_cheapest_listing)]),
-                    html.Div(className="values-item keyfig-percent", children=[percentage(most_expensive_listing, ttl_most_expensive_listing)]),
-                    html.Div(className="values-item keyfig-percent", children=[percentage(median_price, ttl_median_price)])
+                    html.Div(className="values-item keyfig-percent", children=[percentage(cheapest_listing, snap.ttl_cheapest_listing)]),
+                    html.Div(className="values-item keyfig-percent", children=[percentage(most_expensive_listing, snap.ttl_most_expensive_listing)]),
+                    html.Div(className="values-item keyfig-percent", children=[percentage(median_price, snap.ttl_median_price)])
             ])
         ]
     else:
@@ -325,124 +416,107 @@ def update_keyfig(data):
             )
         ]
 
-# Update listings counts
-@app.callback(Output("listings-count", "children"), Input("memory-output", "data"))
-def update_listings_count(data):
-    if data is None:
-        raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) < 0:
-        return [
-            html.Div("No data available.")
-        ]
-    else:
-        return [
-            html.Div(className="listcount-title", children="Amount of listings"),
-            html.Div(className="listcount-num", children=[
-                html.Div(f"{len(df)}")
-            ])
-        ]
+# Listings count
+def listings_count_children(summary):
+    return [
+        html.Div(className="listcount-title", children="Amount of listings"),
+        html.Div(className="listcount-num", children=[
+            html.Div(f"{summary['count']}")
+        ])
+    ]
 
-# Map callback
-@app.callback(Output("count-map", "children"), Input("memory-output", "data"))
-def update_map(data):
-    if data is None:
-        raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        loc_counts = df["Location"].value_counts().reset_index()
-        loc_counts.columns = ["Location", "Count"]
-        ns = Namespace("myNamespace", "mySubNamespace")
-        hover_style = dict(weight=6, fillColor="#57cf36", fillOpacity=0.3)
-        geo_df = gpd.read_file("Finland.json")
-        region_names = geo_df.copy(deep=True)
-        region_names["tooltip"] = geo_df.name + "<br>" + f"Listings: " + geo_df.listing_count + "<br>" + f"Median €/m²: " + geo_df.median_price
-        geoj = dl.GeoJSON(data=json.loads(region_names.to_json()), hoverStyle=arrow_function(hover_style), options=dict(pointToLayer=ns("pointToLayer"), style=dict(color="#58B505")))
-        return [
-            html.Div(className="map-title", children="Location reference & data based on full dataset"),
-            dl.Map([geoj, dl.TileLayer()], center=(61.5, 25), zoom=6, style={"height" : "310px"})
-            
-        ]
+def map_hideout(summary):
+    if summary["count"] > 0:
+        return region_hideout(summary["regions"])
     else:
-        return html.Div("Location reference & data based on full dataset")
-# Update price distribution box plot
-@app.callback(Output("price-distrib", "figure"), Input("memory-output", "data"))
-def update_box_plot(data):
-    if data is None:
-        raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        prices = df["Price"]
+        return dict(counts={}, medians={}, max_count=0)
+
+# Price distribution box plot
+def box_plot_figure(summary):
+    if summary["count"] > 0:
+        box = summary["price_box"]
         figure = go.Figure()
-        figure.add_trace(go.Box(y = prices, marker_color="#58B505", boxpoints=False, name="Price"))
+        figure.add_trace(go.Box(q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]], lowerfence=[box["lowerfence"]],
+                                upperfence=[box["upperfence"]], x=["Price"], marker_color="#58B505", boxpoints=False, name="Price"))
+        if box["outliers"]:
+            figure.add_trace(go.Scatter(x=["Price"] * len(box["outliers"]), y=box["outliers"], mode="markers",
+                                        marker_color="#58B505", showlegend=False, hoverinfo="y"))
         figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
         return figure
     else:
-        figure = go.Figure(data=[])
-        figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
-        figure.update_xaxes(visible=False)
-        figure.update_yaxes(visible=False)
-        return figure
+        return empty_figure()
 
-# Update types pie chart
-@app.callback(Output("types-pie", "figure"),
-              Input("memory-output", "data"))
-def update_types_pie(data):
+# Pie chart of category counts, used for both types and rooms
+def pie_figure(counts):
     colors = ["#0B2027", "#40798C", "#70A9A1", "#CFD7C7", "#F6F1D1", "E9E0A6"]
-    if data is None:
-         raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        types = df["Type"].unique()
-        type_count = df["Type"].value_counts(sort=False).array
-        figure = go.Figure(data=[go.Pie(labels=types, values=type_count)], 
-        layout=go.Layout(margin={"t" : 0, "b" : 0}, height=250))
-        figure.update_traces(
-            hoverinfo="value", 
-            textinfo="label+percent", 
-            marker=dict(colors = colors), 
-            hole=0.5, 
-            textposition="outside",
-        )
-        figure.update(layout_showlegend=False)
-        return figure
+    figure = go.Figure(data=[go.Pie(labels=counts.index, values=counts.array)], 
+    layout=go.Layout(margin={"t" : 0, "b" : 0}, height=250))
+    figure.update_traces(
+        hoverinfo="value", 
+        textinfo="label+percent", 
+        marker=dict(colors = colors), 
+        hole=0.5, 
+        textposition="outside",
+    )
+    figure.update(layout_showlegend=False)
+    return figure
+
+def types_pie_figure(summary):
+    if summary["count"] > 0:
+        return pie_figure(summary["types"])
     else:
-        figure = go.Figure(data=[])
-        figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
-        figure.update_xaxes(visible=False)
-        figure.update_yaxes(visible=False)
-        return figure
+        return empty_figure()
 
-# Update rooms pie chart
-@app.callback(Output("rooms-pie", "figure"),
-              Input("memory-output", "data"))
-def update_rooms_pie(data):
-    color_map={"1H":"#0B2027","2H":"#40798C","3H":"#70A9A1","4H":"#CFD7C7","5H":"#F6F1D1","6H":"E9E0A6"},
-    colors = ["#0B2027", "#40798C", "#70A9A1", "#CFD7C7", "#F6F1D1", "E9E0A6"]
-    if data is None:
-         raise PreventUpdate
-    df = pd.DataFrame(data)
-    if len(df) > 0:
-        rooms = df["Rooms"].unique()
-        room_count = df["Rooms"].value_counts(sort=False).array
-        figure = go.Figure(data=[go.Pie(labels=rooms, values=room_count)], layout=go.Layout(margin={"t" : 0, "b" : 0}, height=250))
-        figure.update_traces(
-            hoverinfo="value", 
-            textinfo="label+percent",
-            marker=dict(colors = colors), 
-            hole=0.5, 
-            textposition="outside",
-            
-        )
-        figure.update(layout_showlegend=False)
-        return figure
+def rooms_pie_figure(summary):
+    if summary["count"] > 0:
+        return pie_figure(summary["rooms"])
     else:
-        figure = go.Figure(data=[])
-        figure.update_layout({"plot_bgcolor": "rgba(0,0,0,0)"})
-        figure.update_xaxes(visible=False)
-        figure.update_yaxes(visible=False)
-        return figure
-    
+        return empty_figure()
+
+# Figures are memoized as a whole, with the number of matching listings for the metrics, so a
+# cache hit neither filters nor summarizes
+@figure_cache.memoize("dashboard_figures")
+def dashboard_figures(snap, data):
+    summary = dashboard_summary(data, snap)
+    return summary["count"], (price_horizontal_figure(summary), keyfig_children(summary, snap),
+                              listings_count_children(summary), map_hideout(summary), box_plot_figure(summary),
+                              types_pie_figure(summary), rooms_pie_figure(summary))
+
+# Update every output from one pass over the filtered data
+@instrument("update_dashboard")
+def update_dashboard(data, session=None):
+    if data is None:
+        raise PreventUpdate
+    snap = snapshot
+    count, figures = callback_pool.run(session, "update_dashboard", data.get("seq"), dashboard_figures, snap, data)
+    record_rows(len(snap.df), count)
+    return figures
+
+FILTER_INPUTS = [Input("housing-type-dropdown", "value"), Input("location-dropdown", "value"),
+                 Input("price-slider", "value"), Input("year-slider", "value"),
+                 Input("size-slider", "value"), Input("rooms-dropdown", "value")]
+DASHBOARD_OUTPUTS = [Output("price-m2-median-by-loc", "figure"), Output("key-figures", "children"),
+                     Output("listings-count", "children"), Output("region-geojson", "hideout"),
+                     Output("price-distrib", "figure"), Output("types-pie", "figure"), Output("rooms-pie", "figure")]
+
+# Load the geometry level matching the zoom
+app.clientside_callback(
+    ClientsideFunction(namespace="clientside", function_name="geometryUrl"),
+    Output("region-geojson", "url"), Input("region-map", "zoom"), State("region-geometry-levels", "data"))
+
+# In the clientside mode the filters are answered in the browser from the listings-columns store
+# (assets/clientside.js), otherwise by the filter_data & update_dashboard server callbacks below
+if CLIENTSIDE_FILTERING:
+    app.clientside_callback(
+        ClientsideFunction(namespace="clientside", function_name="updateDashboard"),
+        *DASHBOARD_OUTPUTS, *FILTER_INPUTS, State("listings-columns", "data"))
+else:
+    app.clientside_callback(ClientsideFunction(namespace="clientside", function_name="requestSeq"),
+                            Output("request-seq", "data"), *FILTER_INPUTS, Input("title-search", "value"))
+    app.callback(Output("memory-output", "data"), *FILTER_INPUTS, Input("title-search", "value"),
+                 Input("request-seq", "data"))(filter_data)
+    app.callback(*DASHBOARD_OUTPUTS, Input("memory-output", "data"), State("session-id", "data"))(update_dashboard)
+
 if __name__ == "__main__":
     app.run_server(debug=True)
 
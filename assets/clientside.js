@@ -0,0 +1,297 @@
+// Clientside filtering mode (CLIENTSIDE_FILTERING=1): the listings are sent to the browser once
+// as typed arrays (see clientside.py) and every filter change is answered here, without a
+// server round trip. Mirrors aggregate.summarize and the figure functions of app.py.
+(function () {
+    const TYPED_ARRAYS = {
+        int8: Int8Array, int16: Int16Array, int32: Int32Array, uint8: Uint8Array,
+        uint16: Uint16Array, uint32: Uint32Array, float32: Float32Array, float64: Float64Array,
+    };
+    const PIE_COLORS = ["#0B2027", "#40798C", "#70A9A1", "#CFD7C7", "#F6F1D1", "E9E0A6"];
+    let decoded = null;
+    let requestSeq = 0;
+
+    function decodeColumn(column) {
+        const binary = atob(column.data);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new TYPED_ARRAYS[column.dtype](bytes.buffer);
+    }
+
+    // The columns are decoded once per dataset version
+    function columns(payload) {
+        if (decoded === null || decoded.version !== payload.version) {
+            const cols = {};
+            for (const name in payload.columns) {
+                cols[name] = decodeColumn(payload.columns[name]);
+            }
+            decoded = {version: payload.version, columns: cols};
+        }
+        return decoded.columns;
+    }
+
+    // Lookup table of the selected category codes, null when nothing is selected
+    function selection(categories, values) {
+        if (!values || values.length === 0) {
+            return null;
+        }
+        const selected = new Uint8Array(categories.length);
+        values.forEach(function (value) {
+            const code = categories.indexOf(value);
+            if (code >= 0) {
+                selected[code] = 1;
+            }
+        });
+        return selected;
+    }
+
+    // Same interpolation as numpy's default (linear) quantile
+    function quantile(sorted, q) {
+        const position = q * (sorted.length - 1);
+        const lower = Math.floor(position);
+        const upper = Math.min(lower + 1, sorted.length - 1);
+        return sorted[lower] + (sorted[upper] - sorted[lower]) * (position - lower);
+    }
+
+    function median(sorted) {
+        return quantile(sorted, 0.5);
+    }
+
+    function sortedCopy(values) {
+        return Float64Array.from(values).sort();
+    }
+
+    function summarize(payload, types, locations, price, year, size, rooms) {
+        const cols = columns(payload);
+        const cats = payload.categories;
+        const typeSel = selection(cats.Type, types);
+        const locationSel = selection(cats.Location, locations);
+        const roomsSel = selection(cats.Rooms, rooms);
+        const typeCounts = new Array(cats.Type.length).fill(0);
+        const roomCounts = new Array(cats.Rooms.length).fill(0);
+        const regionValues = cats.Location.map(function () { return []; });
+        const prices = [];
+        const sizes = [];
+        const years = [];
+        const pricesM2 = [];
+
+        for (let i = 0; i < payload.rows; i++) {
+            const p = cols.Price[i], y = cols.Year[i], s = cols.Size[i];
+            if (p < price[0] || p > price[1] || y < year[0] || y > year[1] || s < size[0] || s > size[1]) {
+                continue;
+            }
+            const t = cols.Type[i], l = cols.Location[i], r = cols.Rooms[i];
+            if ((typeSel && (t < 0 || !typeSel[t])) || (locationSel && (l < 0 || !locationSel[l])) ||
+                (roomsSel && (r < 0 || !roomsSel[r]))) {
+                continue;
+            }
+            if (t >= 0) typeCounts[t]++;
+            if (r >= 0) roomCounts[r]++;
+            if (l >= 0) regionValues[l].push(cols.Price_M2[i]);
+            prices.push(p);
+            sizes.push(s);
+            years.push(y);
+            pricesM2.push(cols.Price_M2[i]);
+        }
+
+        const summary = {count: prices.length};
+        if (summary.count === 0) {
+            return summary;
+        }
+        const sortedPrices = sortedCopy(prices);
+        const q1 = quantile(sortedPrices, 0.25), q3 = quantile(sortedPrices, 0.75);
+        const iqr = q3 - q1;
+        let lowerfence = Infinity, upperfence = -Infinity;
+        for (let i = 0; i < sortedPrices.length; i++) {
+            const v = sortedPrices[i];
+            if (v >= q1 - 1.5 * iqr && v <= q3 + 1.5 * iqr) {
+                lowerfence = Math.min(lowerfence, v);
+                upperfence = Math.max(upperfence, v);
+            }
+        }
+        summary.price_box = {q1: q1, median: median(sortedPrices), q3: q3, lowerfence: lowerfence, upperfence: upperfence};
+        summary.price_min = sortedPrices[0];
+        summary.price_max = sortedPrices[sortedPrices.length - 1];
+        summary.price_median = summary.price_box.median;
+        summary.size_mean = sizes.reduce(function (a, b) { return a + b; }, 0) / sizes.length;
+        summary.price_m2_median = median(sortedCopy(pricesM2));
+        summary.year_median = median(sortedCopy(years));
+        summary.types = present(cats.Type, typeCounts);
+        summary.rooms = present(cats.Rooms, roomCounts);
+        summary.regions = [];
+        regionValues.forEach(function (values, code) {
+            if (values.length > 0) {
+                summary.regions.push({name: cats.Location[code], count: values.length, median: median(sortedCopy(values))});
+            }
+        });
+        return summary;
+    }
+
+    function present(categories, counts) {
+        const labels = [], values = [];
+        counts.forEach(function (count, code) {
+            if (count > 0) {
+                labels.push(categories[code]);
+                values.push(count);
+            }
+        });
+        return {labels: labels, values: values};
+    }
+
+    // *** Components & figures ***
+    function component(type, props) {
+        return {namespace: "dash_html_components", type: type, props: props};
+    }
+
+    function div(className, children) {
+        return component("Div", className ? {className: className, children: children} : {children: children});
+    }
+
+    function euros(value) {
+        return value.toLocaleString("en-US").replace(/,/g, " ") + " €";
+    }
+
+    function percentage(part, whole) {
+        const value = Math.floor(100 * part / whole) - 100;
+        if (value < 0) return div("perc-neg", value + " %");
+        if (value > 0) return div("perc-pos", "+" + value + " %");
+        return "-";
+    }
+
+    function yearComparison(year, medianYear) {
+        const diff = year - medianYear;
+        if (diff > 0) return div("year-test-pos", "+" + diff);
+        if (diff < 0) return div("year-test-neg", "" + diff);
+        return "-";
+    }
+
+    function emptyFigure() {
+        return {data: [], layout: {plot_bgcolor: "rgba(0,0,0,0)", xaxis: {visible: false}, yaxis: {visible: false}}};
+    }
+
+    function priceHorizontalFigure(summary) {
+        const regions = summary.regions.map(function (region) {
+            return {name: region.name, value: Math.round(region.median)};
+        }).sort(function (a, b) { return b.value - a.value; });
+        return {
+            data: [{
+                type: "bar", orientation: "h",
+                x: regions.map(function (r) { return r.value; }),
+                y: regions.map(function (r) { return r.name; }),
+                text: regions.map(function (r) { return r.value; }),
+                marker: {color: "#58B505"}, textposition: "outside", cliponaxis: false, texttemplate: "%{text} €",
+            }],
+            layout: {plot_bgcolor: "rgba(0,0,0,0)", xaxis: {showticklabels: false, title: {text: ""}}, yaxis: {title: {text: ""}}},
+        };
+    }
+
+    function keyfigChildren(summary, baseline) {
+        const medianSize = Math.floor(summary.size_mean);
+        const medianEuroM2 = Math.floor(summary.price_m2_median);
+        const medianYear = Math.floor(summary.year_median);
+        const medianPrice = Math.floor(summary.price_median);
+        return [
+            div("keyfig-tooltip", [
+                div("info-text tooltip", [
+                    component("Span", {className: "info-text-i", children: "*"}),
+                    component("Span", {className: "tooltiptext", children: "Percentages are compared to the complete dataset values."}),
+                ]),
+            ]),
+            div("keyfig-row keyfig-row-1", [
+                div("labels-item", "Mean size"),
+                div("labels-item", "Median €/m²"),
+                div("labels-item", "Median year of construction"),
+                div("values-item", medianSize + " m²"),
+                div("values-item", euros(medianEuroM2)),
+                div("values-item", "" + medianYear),
+                div("values-item keyfig-percent", [percentage(medianSize, baseline.ttl_median_size)]),
+                div("values-item keyfig-percent", [percentage(medianEuroM2, baseline.ttl_median_euro_m2)]),
+                div("values-item keyfig-percent", [yearComparison(medianYear, baseline.ttl_median_year)]),
+            ]),
+            div("keyfig-row keyfig-row-2", [
+                div("labels-item", "Cheapest listing"),
+                div("labels-item", "Most expensive"),
+                div("labels-item", "Median price"),
+                div("values-item", euros(summary.price_min)),
+                div("values-item", euros(summary.price_max)),
+                div("values-item", euros(medianPrice)),
+                div("values-item keyfig-percent", [percentage(summary.price_min, baseline.ttl_cheapest_listing)]),
+                div("values-item keyfig-percent", [percentage(summary.price_max, baseline.ttl_most_expensive_listing)]),
+                div("values-item keyfig-percent", [percentage(medianPrice, baseline.ttl_median_price)]),
+            ]),
+        ];
+    }
+
+    function listingsCountChildren(summary) {
+        return [
+            div("listcount-title", "Amount of listings"),
+            div("listcount-num", [div(null, "" + summary.count)]),
+        ];
+    }
+
+    // Same as regions.region_hideout, the map restyles the regions from it
+    function mapHideout(summary) {
+        const counts = {}, medians = {};
+        let maxCount = 0;
+        (summary.regions || []).forEach(function (region) {
+            counts[region.name] = region.count;
+            medians[region.name] = Math.round(region.median) + " €";
+            maxCount = Math.max(maxCount, region.count);
+        });
+        return {counts: counts, medians: medians, max_count: maxCount};
+    }
+
+    function boxPlotFigure(summary) {
+        const box = summary.price_box;
+        return {
+            data: [{
+                type: "box", q1: [box.q1], median: [box.median], q3: [box.q3], lowerfence: [box.lowerfence],
+                upperfence: [box.upperfence], x: ["Price"], marker: {color: "#58B505"}, boxpoints: false, name: "Price",
+            }],
+            layout: {plot_bgcolor: "rgba(0,0,0,0)"},
+        };
+    }
+
+    function pieFigure(counts) {
+        return {
+            data: [{
+                type: "pie", labels: counts.labels, values: counts.values, hoverinfo: "value", textinfo: "label+percent",
+                marker: {colors: PIE_COLORS}, hole: 0.5, textposition: "outside",
+            }],
+            layout: {margin: {t: 0, b: 0}, height: 250, showlegend: false},
+        };
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        clientside: {
+            updateDashboard: function (types, locations, price, year, size, rooms, payload) {
+                if (!payload || !price || !year || !size) {
+                    return window.dash_clientside.no_update;
+                }
+                const summary = summarize(payload, types, locations, price, year, size, rooms);
+                if (summary.count === 0) {
+                    const empty = [div(null, component("P", {className: "empty-data-error", children: "No listings with given options."}))];
+                    return [emptyFigure(), empty, listingsCountChildren(summary), mapHideout(summary),
+                            emptyFigure(), emptyFigure(), emptyFigure()];
+                }
+                return [priceHorizontalFigure(summary), keyfigChildren(summary, payload.baseline), listingsCountChildren(summary),
+                        mapHideout(summary), boxPlotFigure(summary), pieFigure(summary.types), pieFigure(summary.rooms)];
+            },
+            // Numbers the filter changes of this page load, see callback_pool.py
+            requestSeq: function () {
+                requestSeq += 1;
+                return requestSeq;
+            },
+            // Geometry level for the zoom, levels are [max_zoom, url] pairs (see regions.geometry_levels)
+            geometryUrl: function (zoom, levels) {
+                for (let i = 0; i < levels.length; i++) {
+                    if (levels[i][0] !== null && zoom <= levels[i][0]) {
+                        return levels[i][1];
+                    }
+                }
+                return levels[levels.length - 1][1];
+            },
+        },
+    });
+})();
@@ -2,7 +2,24 @@ window.myNamespace = Object.assign({}, window.myNamespace, {
     mySubNamespace: {  
         pointToLayer: function(feature, latlng, context) {  
             return L.circleMarker(latlng)  
-        }  
+        },
+        // The regions are restyled from the hideout (see regions.region_hideout) on every update,
+        // regions with more listings are filled more
+        regionStyle: function(feature, context) {
+            const hideout = context.props.hideout || {};
+            const count = (hideout.counts || {})[feature.properties.name] || 0;
+            const opacity = hideout.max_count ? 0.05 + 0.45 * count / hideout.max_count : 0.05;
+            return {color: "#58B505", weight: 2, fillOpacity: opacity};
+        },
+        // The tooltip is built when opened, so it always shows the numbers of the latest hideout
+        regionTooltip: function(feature, layer, context) {
+            layer.bindTooltip(function() {
+                const hideout = context.props.hideout || {};
+                const name = feature.properties.name;
+                return name + "<br>Listings: " + ((hideout.counts || {})[name] || 0) +
+                    "<br>Median €/m²: " + ((hideout.medians || {})[name] || "-");
+            });
+        }
     }  
 });
 
@@ -0,0 +1,94 @@
+# Times filter_data, every figure of the dashboard callback and the map on synthetic datasets of
+# 5k, 100k and 1M listings (see synthetic.py), replaying the filter states of
+# filter_sequences.json. Every call starts from cold memos; the figure cache is off unless
+# FIGURE_CACHE is set. Reported per callback: p50/p99 wall time and the mean size of the JSON
+# the browser would receive.
+#
+# Usage: python benchmarks/bench_callbacks.py [sizes...] [--repeats N]
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import plotly
+
+os.environ.setdefault("DATA_RELOAD_INTERVAL", "0")
+os.environ.setdefault("FIGURE_CACHE", "off")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+
+import app
+from aggregate import summarize
+from snapshot import Snapshot
+from dataset import compact
+from synthetic import SIZES, synthetic_listings
+from title_index import TitleIndex
+
+SEQUENCES = os.path.join(os.path.dirname(__file__), "filter_sequences.json")
+
+def load_handles(path=SEQUENCES):
+    with open(path, encoding="utf8") as f:
+        sequences = json.load(f)
+    return [app.make_query_handle(state["type"], state["location"], state["price"], state["year"],
+                                  state["size"], state["rooms"], state.get("search"))
+            for sequence in sequences for state in sequence]
+
+def payload_bytes(value):
+    return len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder))
+
+def clear_memos():
+    app._filter_rows.cache_clear()
+    app._summary.cache_clear()
+    app.figure_cache.clear()
+
+# name -> (function of (snap, handle, summary), whether its output is sent to the browser)
+BENCHMARKS = {
+    "filter_data": (lambda snap, handle, summary: app.filter_data(handle["type"], handle["location"], handle["price"],
+                                                                   handle["year"], handle["size"], handle["rooms"],
+                                                                   handle["search"]), True),
+    "title search": (lambda snap, handle, summary: snap.title_index.search(handle["search"]), False),
+    "query rows": (lambda snap, handle, summary: app.filtered_rows(handle, snap), False),
+    "summarize": (lambda snap, handle, summary: summarize(app.filtered_rows(handle, snap)), False),
+    "dashboard_summary": (lambda snap, handle, summary: app.dashboard_summary(handle, snap), False),
+    "price_horizontal_figure": (lambda snap, handle, summary: app.price_horizontal_figure(summary), True),
+    "keyfig_children": (lambda snap, handle, summary: app.keyfig_children(summary, snap), True),
+    "listings_count_children": (lambda snap, handle, summary: app.listings_count_children(summary), True),
+    "box_plot_figure": (lambda snap, handle, summary: app.box_plot_figure(summary), True),
+    "types_pie_figure": (lambda snap, handle, summary: app.types_pie_figure(summary), True),
+    "rooms_pie_figure": (lambda snap, handle, summary: app.rooms_pie_figure(summary), True),
+    "update_map": (lambda snap, handle, summary: app.map_hideout(summary), True),
+    "update_dashboard": (lambda snap, handle, summary: app.update_dashboard(handle), True),
+}
+
+def run(size_name, handles, repeats):
+    start = time.perf_counter()
+    df = synthetic_listings(SIZES[size_name])
+    snap = Snapshot(compact(df), f"synthetic-{size_name}", TitleIndex.build(df["Title"].fillna("").astype(str)))
+    app.swap_snapshot(snap)
+    print(f"\n{size_name} listings (snapshot built in {time.perf_counter() - start:.2f} s)")
+    print(f"{'callback':<26}{'p50 ms':>10}{'p99 ms':>10}{'payload B':>12}")
+    summaries = [app.dashboard_summary(handle, snap) for handle in handles]
+    for name, (func, sent) in BENCHMARKS.items():
+        timings = []
+        sizes = []
+        for _ in range(repeats):
+            for handle, summary in zip(handles, summaries):
+                clear_memos()
+                start = time.perf_counter()
+                result = func(snap, handle, summary)
+                timings.append((time.perf_counter() - start) * 1000)
+                if sent and len(sizes) < len(handles):
+                    sizes.append(payload_bytes(result))
+        payload = f"{np.mean(sizes):>12.0f}" if sizes else f"{'-':>12}"
+        print(f"{name:<26}{np.percentile(timings, 50):>10.2f}{np.percentile(timings, 99):>10.2f}{payload}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Dash callbacks on synthetic datasets")
+    parser.add_argument("sizes", nargs="*", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    handles = load_handles()
+    for size_name in args.sizes:
+        run(size_name, handles, args.repeats)
@@ -0,0 +1,233 @@
+# Load harness: starts the app locally (gunicorn, optionally on a synthetic dataset) and replays
+# the filter sequences of filter_sequences.json from many concurrent sessions against
+# /_dash-update-component, the way the browser does: filter_data first, then the dashboard
+# callback with the returned handle. Reports p50/p99 latency, throughput and payload bytes.
+#
+# --drag N simulates slider drags: before every filter state, N - 1 intermediate slider positions
+# are sent without waiting for their responses, as the browser does while the handle is dragged.
+# The server should drop the superseded ones (204, counted as "superseded") and the latency of
+# the final state should stay bounded however many sessions are dragging; --max-p99-ms turns that
+# into a pass/fail check.
+#
+# Runs fully offline: only the callback endpoint is exercised, the remote Lottie animation and
+# map tiles are loaded by the browser and never requested here.
+#
+# Usage: python benchmarks/load_test.py [--rows 100k] [--sessions 16] [--rounds 3] [--workers 2]
+#        python benchmarks/load_test.py --url http://127.0.0.1:8050   (an already running server)
+#        python benchmarks/load_test.py --rows 1M --sessions 32 --drag 5
+#        python benchmarks/load_test.py --rows 100k --sessions 16 --drag 5 --max-p99-ms 3000   (a check)
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SEQUENCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filter_sequences.json")
+
+FILTER_INPUTS = [("housing-type-dropdown", "value", "type"), ("location-dropdown", "value", "location"),
+                 ("price-slider", "value", "price"), ("year-slider", "value", "year"),
+                 ("size-slider", "value", "size"), ("rooms-dropdown", "value", "rooms"),
+                 ("title-search", "value", "search")]
+DASHBOARD_OUTPUTS = [("price-m2-median-by-loc", "figure"), ("key-figures", "children"), ("listings-count", "children"),
+                     ("region-geojson", "hideout"), ("price-distrib", "figure"), ("types-pie", "figure"), ("rooms-pie", "figure")]
+
+# seq is the number the browser gives every filter change (the request-seq store)
+def filter_request(state, changed, seq):
+    return {
+        "output": "memory-output.data",
+        "outputs": {"id": "memory-output", "property": "data"},
+        "inputs": [{"id": id, "property": prop, "value": state.get(key) or None} for id, prop, key in FILTER_INPUTS] +
+                  [{"id": "request-seq", "property": "data", "value": seq}],
+        "changedPropIds": [changed],
+    }
+
+def dashboard_request(handle, session_id):
+    return {
+        "output": ".." + "...".join(f"{id}.{prop}" for id, prop in DASHBOARD_OUTPUTS) + "..",
+        "outputs": [{"id": id, "property": prop} for id, prop in DASHBOARD_OUTPUTS],
+        "inputs": [{"id": "memory-output", "property": "data", "value": handle}],
+        "changedPropIds": ["memory-output.data"],
+        "state": [{"id": "session-id", "property": "data", "value": session_id}],
+    }
+
+# Slider positions on the way from the previous state to the next one
+def drag_states(previous, state, steps):
+    start = previous["price"] if previous is not None else state["price"]
+    return [dict(state, price=[start[i] + (state["price"][i] - start[i]) * step // steps for i in range(2)])
+            for step in range(1, steps)]
+
+def changed_input(previous, state):
+    for id, prop, key in FILTER_INPUTS:
+        if previous is None or previous.get(key) != state.get(key):
+            return f"{id}.{prop}"
+    return "price-slider.value"
+
+# One simulated browser session with a keep-alive connection
+class Session:
+    def __init__(self, url, timeout=60, drag=1):
+        parts = urlsplit(url)
+        self.url = url
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+        self.session_id = uuid.uuid4().hex
+        self.seq = 0
+        self.drag = drag
+
+    def next_seq(self):
+        self.seq += 1
+        return self.seq
+
+    def post(self, body):
+        data = json.dumps(body).encode("utf8")
+        start = time.perf_counter()
+        self.conn.request("POST", "/_dash-update-component", body=data, headers={"Content-Type": "application/json"})
+        response = self.conn.getresponse()
+        payload = response.read()
+        elapsed = time.perf_counter() - start
+        if response.status == 204:
+            return None, elapsed, len(payload)
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        return json.loads(payload), elapsed, len(payload)
+
+    # Intermediate states go out on their own connections and are not waited for. Like in the
+    # browser each one triggers the dashboard callback, which drops it once a newer state arrived.
+    def send_intermediate(self, state, results):
+        body = filter_request(state, "price-slider.value", self.next_seq())
+
+        def send():
+            session = Session(self.url)
+            response, _, _ = session.post(body)
+            handle = response["response"]["memory-output"]["data"]
+            response, elapsed, size = session.post(dashboard_request(handle, self.session_id))
+            results["superseded" if response is None else "intermediate"].append((elapsed, size))
+        thread = threading.Thread(target=send)
+        thread.start()
+        time.sleep(0.005)
+        return thread
+
+    def replay(self, sequence, results):
+        previous = None
+        for state in sequence:
+            start = time.perf_counter()
+            pending = [self.send_intermediate(intermediate, results)
+                       for intermediate in drag_states(previous, state, self.drag)]
+            response, elapsed, size = self.post(filter_request(state, changed_input(previous, state), self.next_seq()))
+            results["filter_data"].append((elapsed, size))
+            handle = response["response"]["memory-output"]["data"]
+            _, elapsed, size = self.post(dashboard_request(handle, self.session_id))
+            results["update_dashboard"].append((elapsed, size))
+            results["interaction"].append((time.perf_counter() - start, 0))
+            for thread in pending:
+                thread.join()
+            previous = state
+
+def start_server(port, workers, threads, artifact_dir, extra_env):
+    env = dict(os.environ, DATA_RELOAD_INTERVAL="0", **extra_env)
+    if artifact_dir:
+        env["DATA_ARTIFACT"] = artifact_dir
+    command = [sys.executable, "-m", "gunicorn", "app:server", "-b", f"127.0.0.1:{port}",
+               "-w", str(workers), "--threads", str(threads), "--timeout", "120"]
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/_dash-layout")
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Server did not start in time")
+
+def report(results, wall):
+    print(f"{'request':<18}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'mean B':>10}")
+    for name, samples in results.items():
+        if not samples:
+            continue
+        times = np.array([elapsed for elapsed, _ in samples]) * 1000
+        sizes = [size for _, size in samples]
+        mean_size = f"{np.mean(sizes):>10.0f}" if name != "interaction" else f"{'-':>10}"
+        print(f"{name:<18}{len(samples):>8}{np.percentile(times, 50):>10.1f}{np.percentile(times, 99):>10.1f}"
+              f"{times.max():>10.1f}{mean_size}")
+    print(f"Throughput: {len(results['interaction']) / wall:.1f} interactions/s over {wall:.1f} s")
+
+def run_load(url, sequences, sessions, rounds, drag=1):
+    results = {"filter_data": [], "update_dashboard": [], "interaction": [], "intermediate": [], "superseded": []}
+    lock = threading.Lock()
+
+    def run_session(index):
+        local = {name: [] for name in results}
+        session = Session(url, drag=drag)
+        for round in range(rounds):
+            session.replay(sequences[(index + round) % len(sequences)], local)
+        with lock:
+            for name, samples in local.items():
+                results[name].extend(samples)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(run_session, range(sessions)))
+    return results, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay filter sequences against a local server")
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--rows", help="serve a synthetic dataset of this size (5k, 100k, 1M or a number)")
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent simulated sessions")
+    parser.add_argument("--rounds", type=int, default=3, help="sequences replayed per session")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sequences", default=SEQUENCES)
+    parser.add_argument("--drag", type=int, default=1, help="slider positions sent per filter change")
+    parser.add_argument("--max-p99-ms", type=float,
+                        help="exit with status 1 when the p99 latency of the final states (interaction) exceeds this")
+    args = parser.parse_args()
+
+    with open(args.sequences, encoding="utf8") as f:
+        sequences = json.load(f)
+
+    server = None
+    tmp = None
+    url = args.url
+    try:
+        if url is None:
+            artifact_dir = None
+            if args.rows:
+                sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+                sys.path.insert(0, ROOT)
+                from synthetic import SIZES, synthetic_listings
+                from dataset import write_artifact
+                tmp = tempfile.TemporaryDirectory()
+                artifact_dir = tmp.name
+                rows = SIZES.get(args.rows) or int(args.rows)
+                write_artifact(synthetic_listings(rows, os.path.join(ROOT, "full_data_cleaned_and_outliers_removed.csv")),
+                               artifact_dir, source=f"synthetic-{rows}")
+            server = start_server(args.port, args.workers, args.threads, artifact_dir, {})
+            url = f"http://127.0.0.1:{args.port}"
+        results, wall = run_load(url, sequences, args.sessions, args.rounds, args.drag)
+        report(results, wall)
+        p99 = np.percentile([elapsed for elapsed, _ in results["interaction"]], 99) * 1000
+        if args.max_p99_ms is not None and p99 > args.max_p99_ms:
+            print(f"FAIL: interaction p99 {p99:.0f} ms exceeds {args.max_p99_ms:.0f} ms", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if tmp is not None:
+            tmp.cleanup()
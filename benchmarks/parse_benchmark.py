@@ -0,0 +1,51 @@
+# Compares the default and the fast parse mode of scrape.py on a corpus of saved result pages
+# (e.g. collected with `python scrape.py --save-pages pages`): both must give identical rows,
+# and the throughput of each is reported in listings per second. Without a pages_dir it runs on
+# the committed fixtures in benchmarks/parse_fixtures, sanitised pages covering the markup edge
+# cases (no m², several house types, no year, <br> and <br/>, relative and id-less hrefs).
+#
+# Usage: python benchmarks/parse_benchmark.py [pages_dir] [repeats]
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from scrape import PARSE_MODES, FAST_PARSER
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_fixtures")
+
+def load_corpus(pages_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, "*.htm*"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+def run(parse, pages, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = [parse(content) for _, content in pages]
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+if __name__ == "__main__":
+    pages_dir = sys.argv[1] if len(sys.argv) > 1 else FIXTURES
+    pages = load_corpus(pages_dir)
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    if not pages:
+        sys.exit(f"No .html pages in {pages_dir}")
+
+    expected, _ = run(PARSE_MODES["default"], pages, 1)
+    listings = sum(len(rows) for rows in expected)
+    mismatches = 0
+    for mode, parse in PARSE_MODES.items():
+        results, seconds = run(parse, pages, repeats)
+        for (name, _), got, want in zip(pages, results, expected):
+            if got != want:
+                mismatches += 1
+                print(f"{mode}: output differs from the default parser on {name}")
+        label = f"{mode} ({FAST_PARSER})" if mode == "fast" else mode
+        print(f"{label:<20} {listings / seconds:>10.0f} listings/s  ({len(pages)} pages, {listings} listings)")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,37 @@
+# Synthetic listing datasets for the benchmarks, sampled from the cleaned dataset: whole rows are
+# drawn with replacement (keeping the joint distribution of type, region, rooms, size and year)
+# and price and size are jittered so the values don't just repeat.
+#
+# Usage: python benchmarks/synthetic.py <rows> <artifact_dir>
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from dataset import CATEGORICAL_COLUMNS, CSV_PATH, compact, read_listings, write_artifact
+
+SIZES = {"5k": 5_000, "100k": 100_000, "1M": 1_000_000}
+
+def synthetic_listings(rows, csv_path=CSV_PATH, seed=0):
+    source = read_listings(csv_path)
+    rng = np.random.default_rng(seed)
+    df = source.iloc[rng.integers(0, len(source), rows)].reset_index(drop=True)
+    price = df["Price"].to_numpy() * rng.uniform(0.95, 1.05, rows)
+    size = df["Size"].to_numpy() * rng.uniform(0.97, 1.03, rows)
+    df["Price"] = np.clip(np.round(price, -2), source["Price"].min(), source["Price"].max()).astype("int64")
+    df["Size"] = np.clip(np.round(size), source["Size"].min(), source["Size"].max()).astype("int64")
+    df["Price_M2"] = df["Price"] / df["Size"]
+    df = df.astype({column: "category" for column in CATEGORICAL_COLUMNS})
+    return df.sort_values(by=["Price"]).reset_index(drop=True)
+
+# Hot frame of a synthetic dataset, as load_listings would return it
+def synthetic_frame(rows, csv_path=CSV_PATH, seed=0):
+    return compact(synthetic_listings(rows, csv_path, seed))
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python benchmarks/synthetic.py <rows> <artifact_dir>")
+    rows = SIZES.get(sys.argv[1]) or int(sys.argv[1])
+    manifest = write_artifact(synthetic_listings(rows), sys.argv[2], source=f"synthetic-{rows}")
+    print(f"Wrote {manifest['rows']} synthetic listings to {sys.argv[2]}")
@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from dash.exceptions import PreventUpdate
+
+from metrics import SUPERSEDED_CALLBACKS
+
+# Threads per process running the heavy callbacks (0 runs them on the request thread)
+HEAVY_CALLBACK_THREADS = int(os.environ.get("HEAVY_CALLBACK_THREADS", str(os.cpu_count() or 2)))
+
+
+class Superseded(Exception):
+    pass
+
+
+# Runs the heavy part of a callback on a bounded thread pool, so at most <threads> aggregations
+# run per process while the request threads keep serving cache hits and static files. Only the
+# latest request of a callback per browser session is worth computing. Requests carry the sequence
+# number the browser gave the filter change: a newer one cancels the previous while it is queued,
+# an older one arriving late is dropped right away, and a request that gets its turn after being
+# superseded is dropped too. The sessions are tracked per process, with several workers a request
+# is only superseded by one handled by the same worker.
+class CallbackPool:
+    def __init__(self, threads=HEAVY_CALLBACK_THREADS, max_sessions=10000):
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="heavy-callback") if threads > 0 else None
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        # (session, callback) -> (sequence, future) of the latest request
+        self.latest = OrderedDict()
+
+    def _run(self, key, seq, func, args):
+        if self.latest.get(key, (seq,))[0] != seq:
+            raise Superseded
+        return func(*args)
+
+    def _submit(self, key, seq, func, args):
+        with self.lock:
+            latest, previous = self.latest.pop(key, (None, None))
+            if seq is None:
+                seq = (latest or 0) + 1
+            elif latest is not None and seq < latest:
+                self.latest[key] = (latest, previous)
+                raise Superseded
+            if previous is not None:
+                previous.cancel()
+            future = self.pool.submit(self._run, key, seq, func, args)
+            self.latest[key] = (seq, future)
+            while len(self.latest) > self.max_sessions:
+                self.latest.popitem(last=False)
+        return future
+
+    # Calls func(*args), raising PreventUpdate when a newer request of the same session replaced it
+    def run(self, session, name, seq, func, *args):
+        if self.pool is None or session is None:
+            return func(*args)
+        try:
+            return self._submit((session, name), seq, func, args).result()
+        except (CancelledError, Superseded):
+            SUPERSEDED_CALLBACKS.labels(name).inc()
+            raise PreventUpdate
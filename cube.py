@@ -0,0 +1,251 @@
+import numpy as np
+import pandas as pd
+
+# Relative accuracy of the approximate quantiles (prices and €/m²), see LogBuckets
+CUBE_ALPHA = 0.01
+# Selections of at most this many listings are summarized exactly from their rows, the cube is
+# only built for datasets larger than this
+CUBE_EXACT_LIMIT = 50_000
+# Bin widths of the range columns. Price bins are a multiple of the price slider step.
+CUBE_BINS = {"Year": 5, "Price": 25_000, "Size": 10}
+CATEGORICAL_COLUMNS = ("Type", "Location", "Rooms")
+
+
+# Bucket i holds the values in (gamma^(i-1), gamma^i] and reports them as 2 gamma^i / (gamma + 1),
+# which is within alpha (relative) of every value in the bucket. A quantile read from merged
+# bucket counts is therefore within alpha of the exact order statistic (the DDSketch bound).
+class LogBuckets:
+    def __init__(self, alpha, low, high):
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.low = max(float(low), 1e-9)
+        self.high = float(high)
+        self.offset = self._raw_index(self.low)
+        self.size = self._raw_index(self.high) - self.offset + 1
+
+    def _raw_index(self, values):
+        return np.ceil(np.log(values) / np.log(self.gamma)).astype(np.int64)
+
+    def index(self, values):
+        return self._raw_index(np.clip(np.asarray(values, dtype=np.float64), self.low, self.high)) - self.offset
+
+    def values(self, indexes):
+        return 2 * self.gamma ** (np.asarray(indexes) + self.offset) / (self.gamma + 1)
+
+# One bucket per integer value, quantiles of integer columns such as Year stay exact
+class LinearBuckets:
+    def __init__(self, low, high):
+        self.low = int(low)
+        self.high = int(high)
+        self.size = self.high - self.low + 1
+
+    def index(self, values):
+        return np.clip(np.asarray(values, dtype=np.int64), self.low, self.high) - self.low
+
+    def values(self, indexes):
+        return np.asarray(indexes, dtype=np.float64) + self.low
+
+# Quantile (linear interpolation, as np.quantile) from bucket counts
+def histogram_quantile(hist, buckets, q):
+    cumulative = np.cumsum(hist)
+    position = q * (cumulative[-1] - 1)
+    lower, upper = np.searchsorted(cumulative, [np.floor(position), np.ceil(position)], side="right")
+    low, high = buckets.values([lower, upper])
+    return float(low + (high - low) * (position - np.floor(position)))
+
+
+# Materialized aggregates over Type x Location x Rooms x binned Year, Price and Size, built once
+# per snapshot. Only non-empty cells are kept, each with its listing count, the size sum, the
+# exact min & max of the range columns and a sparse histogram (sketch) of Price, Price_M2 & Year.
+#
+# A query takes the cells lying completely inside the slider ranges as a whole. Cells cut by a
+# range boundary are resolved from their rows, which the cube keeps grouped by cell. Counts, the
+# min & max price, the mean size and the median year are exact. So are the price quartiles and
+# the box plot fences: the merged price sketch only locates the bucket holding each of them, and
+# the selected rows of that one bucket are read in price order. The €/m² medians are within
+# CUBE_ALPHA of the exact values. Query cost depends on the number of cells, the rows of the
+# boundary cells and of a few price buckets, not on the size of the selection.
+class AggregateCube:
+    def __init__(self, frame, bins=CUBE_BINS, alpha=CUBE_ALPHA):
+        self.categories = {column: frame[column].cat.categories.astype(str) for column in CATEGORICAL_COLUMNS}
+        self.codes = {column: frame[column].cat.codes.to_numpy() for column in CATEGORICAL_COLUMNS}
+        self.values = {column: frame[column].to_numpy() for column in ("Year", "Price", "Size", "Price_M2")}
+
+        key = np.zeros(len(frame), dtype=np.int64)
+        for column in CATEGORICAL_COLUMNS:
+            key = key * (len(self.categories[column]) + 1) + self.codes[column].astype(np.int64) + 1
+        for column, width in bins.items():
+            values = self.values[column].astype(np.int64)
+            binned = (values - values.min()) // width
+            key = key * (int(binned.max()) + 1) + binned
+        _, cell_of_row, counts = np.unique(key, return_inverse=True, return_counts=True)
+
+        self.row_order = np.argsort(cell_of_row, kind="stable")
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        self.cell_count = counts
+        first = self.row_order[self.cell_start]
+        self.cell_codes = {column: codes[first] for column, codes in self.codes.items()}
+        self.cell_min = {}
+        self.cell_max = {}
+        for column in bins:
+            ordered = self.values[column][self.row_order]
+            self.cell_min[column] = np.minimum.reduceat(ordered, self.cell_start)
+            self.cell_max[column] = np.maximum.reduceat(ordered, self.cell_start)
+        self.size_sum = np.add.reduceat(self.values["Size"][self.row_order].astype(np.float64), self.cell_start)
+
+        self.buckets = {
+            "Price": LogBuckets(alpha, self.values["Price"].min(), self.values["Price"].max()),
+            "Price_M2": LogBuckets(alpha, self.values["Price_M2"].min(), self.values["Price_M2"].max()),
+            "Year": LinearBuckets(self.values["Year"].min(), self.values["Year"].max()),
+        }
+        # Rows in price order and where every price bucket starts in it
+        self.price_order = np.argsort(self.values["Price"], kind="stable")
+        price_buckets = self.buckets["Price"].index(self.values["Price"][self.price_order])
+        self.price_bucket_start = np.searchsorted(price_buckets, np.arange(self.buckets["Price"].size + 1))
+        # Sparse sketches: one (cell, bucket, count) entry per non-empty bucket of a cell
+        self.sketches = {}
+        for column, buckets in self.buckets.items():
+            pairs, pair_counts = np.unique(cell_of_row.astype(np.int64) * buckets.size + buckets.index(self.values[column]),
+                                           return_counts=True)
+            self.sketches[column] = (pairs // buckets.size, pairs % buckets.size, pair_counts)
+
+    def __len__(self):
+        return len(self.cell_count)
+
+    # Row positions of the given cells
+    def _cell_rows(self, cells):
+        counts = self.cell_count[cells]
+        offsets = np.repeat(self.cell_start[cells] - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return self.row_order[offsets + np.arange(counts.sum())]
+
+    # Bucket counts of a column over the full cells and the boundary rows, per group code when given
+    def _histogram(self, column, full, rows, groups=None):
+        cells, bucket, counts = self.sketches[column]
+        size = self.buckets[column].size
+        selected = full[cells]
+        cells, bucket, counts = cells[selected], bucket[selected], counts[selected]
+        row_buckets = self.buckets[column].index(self.values[column][rows])
+        if groups is None:
+            return (np.bincount(bucket, weights=counts, minlength=size) +
+                    np.bincount(row_buckets, minlength=size))
+        group_count = len(self.categories[groups])
+        cell_groups = self.cell_codes[groups][cells].astype(np.int64)
+        row_groups = self.codes[groups][rows].astype(np.int64)
+        valid, row_valid = cell_groups >= 0, row_groups >= 0
+        hist = np.bincount(cell_groups[valid] * size + bucket[valid], weights=counts[valid], minlength=group_count * size)
+        hist += np.bincount(row_groups[row_valid] * size + row_buckets[row_valid], minlength=group_count * size)
+        return hist.reshape(group_count, size)
+
+    def _category_counts(self, column, full, rows):
+        minlength = len(self.categories[column])
+        cell_codes, row_codes = self.cell_codes[column][full], self.codes[column][rows]
+        counts = np.bincount(cell_codes[cell_codes >= 0], weights=self.cell_count[full][cell_codes >= 0], minlength=minlength)
+        return (counts + np.bincount(row_codes[row_codes >= 0], minlength=minlength)).astype(np.int64)
+
+    # Which of the given rows match the ranges and the selected category codes
+    def _matches(self, rows, ranges, selected):
+        match = np.ones(len(rows), dtype=bool)
+        for column, codes in selected.items():
+            match &= np.isin(self.codes[column][rows], codes)
+        for column, (low, high) in ranges.items():
+            values = self.values[column][rows]
+            match &= (values >= low) & (values <= high)
+        return match
+
+    # Selected prices of one price bucket, ascending
+    def _bucket_prices(self, bucket, ranges, selected):
+        rows = self.price_order[self.price_bucket_start[bucket]:self.price_bucket_start[bucket + 1]]
+        return self.values["Price"][rows[self._matches(rows, ranges, selected)]]
+
+    # Exact price quantile (linear interpolation, as np.quantile). The cumulative bucket counts
+    # give the bucket and the rank within it of both order statistics.
+    def _price_quantile(self, cumulative, q, bucket_prices):
+        position = q * (cumulative[-1] - 1)
+        values = []
+        for rank in (int(np.floor(position)), int(np.ceil(position))):
+            bucket = int(np.searchsorted(cumulative, rank, side="right"))
+            before = int(cumulative[bucket - 1]) if bucket > 0 else 0
+            values.append(float(bucket_prices(bucket)[rank - before]))
+        return values[0] + (values[1] - values[0]) * (position - np.floor(position))
+
+    # Smallest selected price >= low (upper=False) or largest <= high (upper=True). Bucket indexes
+    # grow with the price, so only the bucket of the bound and the next non-empty one are read.
+    def _price_fence(self, bound, price_hist, bucket_prices, upper):
+        start = int(self.buckets["Price"].index(bound))
+        buckets = np.flatnonzero(price_hist[:start + 1])[::-1] if upper else start + np.flatnonzero(price_hist[start:])
+        for bucket in buckets:
+            prices = bucket_prices(bucket)
+            prices = prices[prices <= bound] if upper else prices[prices >= bound]
+            if len(prices):
+                return float(prices[-1] if upper else prices[0])
+        return None
+
+    def _present(self, column, counts):
+        series = pd.Series(counts, index=self.categories[column])
+        return series[series > 0]
+
+    # Same arguments as QueryEngine.query, returns a summary like aggregate.summarize. Returns None
+    # for selections of at most exact_limit listings, the caller summarizes those from their rows.
+    def summarize(self, ranges=None, categories=None, exact_limit=CUBE_EXACT_LIMIT):
+        ranges = ranges or {}
+        selected = {column: [code for code, value in enumerate(self.categories[column]) if value in values]
+                    for column, values in (categories or {}).items() if values}
+        inside = np.ones(len(self), dtype=bool)
+        full = np.ones(len(self), dtype=bool)
+        for column, codes in selected.items():
+            inside &= np.isin(self.cell_codes[column], codes)
+        for column, (low, high) in ranges.items():
+            inside &= (self.cell_max[column] >= low) & (self.cell_min[column] <= high)
+            full &= (self.cell_min[column] >= low) & (self.cell_max[column] <= high)
+        full &= inside
+        rows = self._cell_rows(np.flatnonzero(inside & ~full))
+        for column, (low, high) in ranges.items():
+            values = self.values[column][rows]
+            rows = rows[(values >= low) & (values <= high)]
+
+        count = int(self.cell_count[full].sum()) + len(rows)
+        if count <= exact_limit:
+            return None
+
+        price_hist = self._histogram("Price", full, rows)
+        prices = self.values["Price"][rows]
+        price_min = int(np.concatenate((self.cell_min["Price"][full], prices)).min())
+        price_max = int(np.concatenate((self.cell_max["Price"][full], prices)).max())
+        # The selected prices of a bucket are read at most once per query
+        resolved = {}
+        def bucket_prices(bucket):
+            if bucket not in resolved:
+                resolved[bucket] = self._bucket_prices(bucket, ranges, selected)
+            return resolved[bucket]
+        cumulative = np.cumsum(price_hist)
+        q1, median, q3 = (self._price_quantile(cumulative, q, bucket_prices) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        price_box = {
+            "q1": q1,
+            "median": median,
+            "q3": q3,
+            "lowerfence": self._price_fence(q1 - 1.5 * iqr, price_hist, bucket_prices, upper=False),
+            "upperfence": self._price_fence(q3 + 1.5 * iqr, price_hist, bucket_prices, upper=True),
+            "outliers": [],
+        }
+
+        location_counts = self._category_counts("Location", full, rows)
+        region_hist = self._histogram("Price_M2", full, rows, groups="Location")
+        medians = np.full(len(location_counts), np.nan)
+        for code in np.flatnonzero(location_counts):
+            medians[code] = histogram_quantile(region_hist[code], self.buckets["Price_M2"], 0.5)
+        regions = pd.DataFrame({"listing_count": location_counts, "median_price": medians},
+                               index=self.categories["Location"])
+
+        return {
+            "count": count,
+            "price_min": price_min,
+            "price_max": price_max,
+            "price_median": median,
+            "size_mean": float(self.size_sum[full].sum() + self.values["Size"][rows].sum()) / count,
+            "price_m2_median": histogram_quantile(self._histogram("Price_M2", full, rows), self.buckets["Price_M2"], 0.5),
+            "year_median": histogram_quantile(self._histogram("Year", full, rows), self.buckets["Year"], 0.5),
+            "types": self._present("Type", self._category_counts("Type", full, rows)),
+            "rooms": self._present("Rooms", self._category_counts("Rooms", full, rows)),
+            "regions": regions[regions["listing_count"] > 0],
+            "price_box": price_box,
+        }
@@ -0,0 +1,205 @@
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from title_index import TitleIndex
+
+# Bump when the layout of the compiled artifact changes, older artifacts are then ignored
+ARTIFACT_FORMAT = 3
+CSV_PATH = "full_data_cleaned_and_outliers_removed.csv"
+ARTIFACT_DIR = "compiled"
+
+CATEGORICAL_COLUMNS = ["Rooms", "Type", "Location"]
+# Narrow dtypes keep the hot frame small, prices stay below 2^32 and sizes & years below 2^16
+NUMERIC_COLUMNS = {"Price": "uint32", "Size": "uint16", "Year": "uint16", "Price_M2": "float32"}
+# Columns of the hot frame used by the callbacks. Title is loaded separately, see load_titles
+HOT_COLUMNS = ["Rooms", "Price", "Size", "Type", "Year", "Location", "Price_M2"]
+
+# Translate house types & room counts from Finnish to English
+TYPE_NAMES = {"Kerrostalo": "Apartment", "Omakotitalo": "House", "Rivitalo": "Rowhouse", "Luhtitalo": "Loft"}
+ROOM_NAMES = {"1H": "1R", "2H": "2R", "3H": "3R", "4H": "4R", "5H": "5R", "6H": "6R"}
+# The regions are translated manually, because of the differences between tori and geojson naming conventions
+REGION_NAMES = {"Etelä-Karjala" : "South Karelia", "Etelä-Pohjanmaa" : "Southern Ostrobothnia", "Etelä-Savo" : "Southern Savonia",
+"Kainuu" : "Kainuu", "Kanta-Häme" : "Tavastia Proper", "Keski-Pohjanmaa" : "Central Ostrobothnia", "Keski-Suomi" : "Central Finland",
+ "Kymenlaakso" : "Kymenlaakso", "Lappi" : "Lapland", "Pirkanmaa" : "Pirkanmaa", "Pohjanmaa" : "Ostrobothnia", "Pohjois-Karjala" : "North Karelia",
+ "Pohjois-Pohjanmaa" : "Northern Ostrobothnia", "Pohjois-Savo" : "Northern Savonia", "Päijät-Häme" : "Päijät-Häme", "Satakunta" : "Satakunta",
+ "Uusimaa" : "Uusimaa", "Varsinais-Suomi" : "Finland Proper"}
+
+
+# Load the data, drop records with empty fields, convert num data to int and sort by price
+def read_listings(csv_path=CSV_PATH):
+    df = pd.read_csv(csv_path, sep=",")
+    df.dropna(subset=["Price", "Rooms", "Size", "Type", "Year"], inplace=True)
+    # Ahvenanmaa has to be dropped, because the geojson for the map doesn't contain it and thus can't visualize it
+    df.drop(df[df["Location"] == "Ahvenanmaa"].index, inplace=True)
+    df = df.astype({"Price": "int", "Year": "int", "Size": "int"})
+    df = df.sort_values(by=["Price"])
+    df["Type"] = df["Type"].replace(TYPE_NAMES)
+    df["Rooms"] = df["Rooms"].replace(ROOM_NAMES)
+    df["Location"] = df["Location"].replace(REGION_NAMES)
+    # €/m² for every row
+    df["Price_M2"] = df["Price"] / df["Size"]
+    df = df.astype({column: "category" for column in CATEGORICAL_COLUMNS})
+    return df.reset_index(drop=True)
+
+# Write the cleaned listings as one .npy file per column plus a manifest. Categorical columns are
+# stored as codes, their categories live in the manifest. Titles go to a plain text file, next to
+# their search index (see title_index.py).
+# Every compile goes to a new subdirectory and the manifest points to it, so running workers that
+# have the previous version memory-mapped are never affected by a recompile.
+def compile_dataset(csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR, keep=2):
+    return write_artifact(read_listings(csv_path), artifact_dir, os.path.basename(csv_path), keep)
+
+# Write cleaned listings (as returned by read_listings) as a new artifact version
+def write_artifact(df, artifact_dir=ARTIFACT_DIR, source="", keep=2):
+    compiled_at = time.time_ns()
+    version_dir = os.path.join(artifact_dir, str(compiled_at))
+    os.makedirs(version_dir)
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "source": source,
+        "compiled_at": compiled_at // 10**9,
+        "path": str(compiled_at),
+        "rows": len(df),
+        "categories": {},
+        "numeric": NUMERIC_COLUMNS,
+    }
+    for column in CATEGORICAL_COLUMNS:
+        categorical = pd.Categorical(df[column])
+        np.save(os.path.join(version_dir, f"{column}.npy"), np.ascontiguousarray(categorical.codes))
+        manifest["categories"][column] = [str(x) for x in categorical.categories]
+    for column, dtype in NUMERIC_COLUMNS.items():
+        np.save(os.path.join(version_dir, f"{column}.npy"), df[column].to_numpy(dtype=dtype))
+    titles = df["Title"].fillna("").astype(str).str.replace("\n", " ", regex=False)
+    with open(os.path.join(version_dir, "Title.txt"), "w", encoding="utf8") as f:
+        f.writelines(title + "\n" for title in titles)
+    TitleIndex.build(titles).save(version_dir)
+    # The manifest is written last, a half-written artifact is never picked up
+    manifest_path = os.path.join(artifact_dir, "manifest.json")
+    with open(manifest_path + ".tmp", "w", encoding="utf8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    prune_versions(artifact_dir, keep)
+    return manifest
+
+# Remove all but the <keep> newest compiled versions
+def prune_versions(artifact_dir=ARTIFACT_DIR, keep=2):
+    versions = sorted((name for name in os.listdir(artifact_dir) if name.isdigit()), key=int)
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(artifact_dir, name), ignore_errors=True)
+
+def read_manifest(artifact_dir=ARTIFACT_DIR):
+    try:
+        with open(os.path.join(artifact_dir, "manifest.json"), encoding="utf8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        return None
+    return manifest
+
+# Hot frame of categorical codes and narrow numeric columns, without any object arrays
+def compact(df):
+    df = df[HOT_COLUMNS].astype(NUMERIC_COLUMNS)
+    return df.astype({column: "category" for column in CATEGORICAL_COLUMNS})
+
+# Columns are memory-mapped and the frame is built around them without a copy (one block per
+# column, the categoricals keep the mapped codes), so processes loading the same version share
+# the pages of the artifact through the page cache. The mapping is copy-on-write: pandas writes
+# into some arrays it is given (e.g. Series.median), a write copies that page and never reaches
+# the file.
+def load_dataset(artifact_dir=ARTIFACT_DIR, manifest=None):
+    manifest = manifest or read_manifest(artifact_dir)
+    version_dir = os.path.join(artifact_dir, manifest["path"])
+    columns = {}
+    for column in HOT_COLUMNS:
+        values = np.load(os.path.join(version_dir, f"{column}.npy"), mmap_mode="c")
+        if column in CATEGORICAL_COLUMNS:
+            values = pd.Categorical.from_codes(values, categories=manifest["categories"][column])
+        columns[column] = values
+    return pd.DataFrame(columns, copy=False)
+
+# Columns of the frame whose data is still the memory-mapped artifact
+def mapped_columns(df):
+    mapped = []
+    for column in df.columns:
+        values = df[column].cat.codes if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column]
+        base = values.to_numpy()
+        while base is not None and not isinstance(base, np.memmap):
+            base = getattr(base, "base", None)
+        if base is not None:
+            mapped.append(column)
+    return mapped
+
+# Identifies the dataset load_listings would return, changes whenever a new one is published
+def dataset_version(csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR):
+    manifest = read_manifest(artifact_dir)
+    if manifest is not None:
+        return f"artifact-{manifest['path']}"
+    stat = os.stat(csv_path)
+    return f"csv-{stat.st_mtime_ns}-{stat.st_size}"
+
+# Prefer the compiled artifact, fall back to cleaning the CSV when it hasn't been built.
+# Returns the listings and their dataset_version.
+def load_listings(csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR):
+    manifest = read_manifest(artifact_dir)
+    if manifest is not None:
+        return load_dataset(artifact_dir, manifest), f"artifact-{manifest['path']}"
+    version = dataset_version(csv_path, artifact_dir)
+    return compact(read_listings(csv_path)), version
+
+# Listing titles in the row order of the listings of the given dataset_version
+def load_titles(version, csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR):
+    if version.startswith("artifact-"):
+        with open(os.path.join(artifact_dir, version[len("artifact-"):], "Title.txt"), encoding="utf8") as f:
+            return f.read().split("\n")[:-1]
+    return read_listings(csv_path)["Title"].fillna("").astype(str).tolist()
+
+# Title search index of the given dataset_version, prebuilt in the artifact or built from the titles
+def load_title_index(version, csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR):
+    if version.startswith("artifact-"):
+        version_dir = os.path.join(artifact_dir, version[len("artifact-"):])
+        if os.path.exists(os.path.join(version_dir, "TitleTokens.txt")):
+            return TitleIndex.load(version_dir)
+    return TitleIndex.build(load_titles(version, csv_path, artifact_dir))
+
+# Bytes per listing of the original in-process frame (object strings, 64-bit numbers, titles
+# included) and of the compact hot frame, with the titles that are now loaded separately
+def memory_report(csv_path=CSV_PATH, artifact_dir=ARTIFACT_DIR):
+    original = read_listings(csv_path).astype({column: object for column in CATEGORICAL_COLUMNS})
+    original = original.astype({"Price": "int64", "Size": "int64", "Year": "int64", "Price_M2": "float64"})
+    hot, version = load_listings(csv_path, artifact_dir)
+    titles = load_titles(version, csv_path, artifact_dir)
+    rows = max(len(hot), 1)
+    report = {
+        "rows": len(hot),
+        "before": original.memory_usage(deep=True, index=False).sum() / rows,
+        "after": hot.memory_usage(deep=True, index=False).sum() / rows,
+        "titles": sum(sys.getsizeof(title) for title in titles) / rows,
+        "mapped": mapped_columns(hot),
+        "columns_before": (original.memory_usage(deep=True, index=False) / rows).to_dict(),
+        "columns_after": (hot.memory_usage(deep=True, index=False) / rows).to_dict(),
+    }
+    return report
+
+if __name__ == "__main__":
+    # Usage: python dataset.py [csv_path] [artifact_dir]          compile the dataset
+    #        python dataset.py report [csv_path] [artifact_dir]   bytes per listing before/after
+    if sys.argv[1:2] == ["report"]:
+        report = memory_report(*sys.argv[2:4])
+        print(f"{report['rows']} listings")
+        print(f"{'column':<12}{'before':>10}{'after':>10}  (bytes per listing)")
+        for column, before in report["columns_before"].items():
+            after = report["columns_after"].get(column)
+            print(f"{column:<12}{before:>10.1f}{after if after is not None else float('nan'):>10.1f}")
+        print(f"{'total':<12}{report['before']:>10.1f}{report['after']:>10.1f}")
+        print(f"Titles, loaded separately: {report['titles']:.1f} bytes per listing")
+        print(f"Memory-mapped from the artifact: {', '.join(report['mapped']) or 'none'}")
+    else:
+        manifest = compile_dataset(*sys.argv[1:3])
+        print(f"Compiled {manifest['rows']} listings (format {manifest['format']})")
@@ -0,0 +1,159 @@
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# In-process LRU, bounded by the total size of the pickled values
+class MemoryBackend:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def size(self):
+        return len(self._entries), self._bytes
+
+
+# SQLite file shared by every gunicorn worker on the host, LRU by last access time
+class DiskBackend:
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries "
+                     "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def _connection(self):
+        # Connections are not carried over a fork, every worker process opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                         (key, value, len(value), time.time()))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for old_key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def size(self):
+        return self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+
+# Memoizes callback results by callback name and a canonical key derived from the arguments.
+# Hit/miss counters are per process.
+class FigureCache:
+    def __init__(self, backend, key_func):
+        self.backend = backend
+        self.key_func = key_func
+        self.hits = 0
+        self.misses = 0
+
+    def memoize(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                if self.backend is None:
+                    return func(*args)
+                key = f"{name}:{self.key_func(*args)!r}"
+                cached = self.backend.get(key)
+                if cached is not None:
+                    self.hits += 1
+                    return pickle.loads(cached)
+                self.misses += 1
+                result = func(*args)
+                self.backend.set(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+                return result
+            return wrapper
+        return decorator
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        entries, size = self.backend.size() if self.backend is not None else (0, 0)
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+# FIGURE_CACHE selects the backend: "memory" (default), "disk" to share between workers or "off".
+# FIGURE_CACHE_MB is the memory budget, FIGURE_CACHE_PATH the SQLite file of the disk backend.
+def backend_from_env():
+    kind = os.environ.get("FIGURE_CACHE", "memory")
+    max_bytes = int(float(os.environ.get("FIGURE_CACHE_MB", "64")) * 1024 * 1024)
+    if kind == "off":
+        return None
+    if kind == "disk":
+        return DiskBackend(os.environ.get("FIGURE_CACHE_PATH", "figure-cache.sqlite"), max_bytes)
+    if kind == "memory":
+        return MemoryBackend(max_bytes)
+    raise ValueError(f"Unknown FIGURE_CACHE backend: {kind}")
@@ -0,0 +1,23 @@
+import os
+
+# Threaded workers: a slow callback occupies one request thread, not the whole worker. The heavy
+# aggregations are bounded per worker by HEAVY_CALLBACK_THREADS (see callback_pool.py).
+# A newer request of a session supersedes the older one only when both reach the same worker:
+# the sessions are tracked per process and requests are not routed to workers by session, so
+# with several workers (WEB_CONCURRENCY, two by default) some superseded requests of a drag are
+# still computed. A single worker per host, or sticky routing by session, avoids that.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+timeout = 120
+
+# The app (the listings, their indexes and the cube) is loaded once in the master and the workers
+# are forked from it, so they share those pages copy-on-write instead of each building their own.
+# A dataset reloaded later is loaded by every worker on its own.
+preload_app = True
+os.environ["START_THREADS_POST_FORK"] = "1"
+
+# Threads of the master are not forked, every worker starts its callback pool and reloader
+def post_fork(server, worker):
+    import app
+    app.start_background_threads()
@@ -0,0 +1,70 @@
+import csv
+import sqlite3
+import time
+
+COLUMNS = ['Title', 'Rooms', 'Price', 'Size', 'Type', 'Year', 'Location']
+
+
+# Upsert-friendly store of scraped listings, keyed by the listing id from the listing URL.
+# Reruns update the existing rows instead of appending duplicates, and the crawl progress is
+# checkpointed so an interrupted run can resume.
+class ListingStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS listings (id TEXT PRIMARY KEY, "
+            + ", ".join(f"{column} TEXT" for column in COLUMNS)
+            + ", first_seen INTEGER, last_seen INTEGER)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS checkpoint (id INTEGER PRIMARY KEY CHECK (id = 0), page INTEGER, updated INTEGER)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def known(self, ids):
+        ids = list(ids)
+        found = set()
+        # Stay below SQLite's limit of bound parameters per statement
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(f"SELECT id FROM listings WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    # listings: (listing_id, row) pairs, row in COLUMNS order
+    def upsert(self, listings, seen_at=None):
+        seen_at = seen_at or int(time.time())
+        updates = ", ".join(f"{column} = excluded.{column}" for column in COLUMNS)
+        self.conn.executemany(
+            f"INSERT INTO listings (id, {', '.join(COLUMNS)}, first_seen, last_seen) "
+            f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}, last_seen = excluded.last_seen",
+            [(listing_id, *row, seen_at, seen_at) for listing_id, row in listings])
+
+    def checkpoint(self):
+        row = self.conn.execute("SELECT page FROM checkpoint WHERE id = 0").fetchone()
+        return row[0] if row else None
+
+    # The page's listings and the checkpoint are committed together
+    def save_checkpoint(self, page):
+        self.conn.execute("INSERT OR REPLACE INTO checkpoint VALUES (0, ?, ?)", (page, int(time.time())))
+        self.conn.commit()
+
+    # Commit upserted listings without moving the checkpoint
+    def commit(self):
+        self.conn.commit()
+
+    def clear_checkpoint(self):
+        self.conn.execute("DELETE FROM checkpoint")
+        self.conn.commit()
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    # Write the stored listings in the housing.csv format
+    def export_csv(self, path):
+        with open(path, 'w', encoding='utf8', newline='') as f:
+            file_write = csv.writer(f)
+            file_write.writerow(COLUMNS)
+            file_write.writerows(self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM listings ORDER BY first_seen, id"))
@@ -0,0 +1,79 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Callbacks slower than this (milliseconds) are logged with their filter combination
+SLOW_CALLBACK_MS = float(os.environ.get("SLOW_CALLBACK_MS", "500"))
+slow_log = logging.getLogger("slow_callbacks")
+
+CALLBACK_SECONDS = Histogram("dash_callback_duration_seconds", "Wall time of a Dash callback", ["callback"],
+                             buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+CALLBACK_ROWS_IN = Counter("dash_callback_rows_in_total", "Listings a callback worked on", ["callback"])
+CALLBACK_ROWS_OUT = Counter("dash_callback_rows_out_total", "Listings matching the filters of a callback", ["callback"])
+RESPONSE_BYTES = Histogram("dash_callback_response_bytes", "Serialized size of a callback response", ["callback"],
+                           buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216))
+SLOW_CALLBACKS = Counter("dash_callback_slow_total", "Callbacks slower than SLOW_CALLBACK_MS", ["callback"])
+SUPERSEDED_CALLBACKS = Counter("dash_callback_superseded_total", "Callbacks dropped for a newer request of the same session",
+                               ["callback"])
+
+_current = threading.local()
+
+
+# Called from inside a callback to record how many listings it read and how many matched
+def record_rows(rows_in, rows_out):
+    call = getattr(_current, "call", None)
+    if call is not None:
+        call["rows"] = (rows_in, rows_out)
+
+# Wraps a callback (below @app.callback) to record its wall time and rows, slow calls are
+# logged with their arguments, i.e. the filter combination
+def instrument(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            _current.call = call = {}
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                _current.call = None
+                CALLBACK_SECONDS.labels(name).observe(elapsed)
+                if "rows" in call:
+                    CALLBACK_ROWS_IN.labels(name).inc(call["rows"][0])
+                    CALLBACK_ROWS_OUT.labels(name).inc(call["rows"][1])
+                if elapsed * 1000 > SLOW_CALLBACK_MS:
+                    SLOW_CALLBACKS.labels(name).inc()
+                    slow_log.warning("%s took %.0f ms, filters: %s", name, elapsed * 1000,
+                                     json.dumps(args, default=str, ensure_ascii=False))
+        return wrapper
+    return decorator
+
+# Registers the /metrics route and the hook measuring the size of every callback response.
+# With PROMETHEUS_MULTIPROC_DIR set (several gunicorn workers) the metrics of all workers are merged.
+def init_app(app):
+    server = app.server
+
+    @server.after_request
+    def measure_response(response):
+        if request.path.endswith("/_dash-update-component") and response.status_code == 200:
+            body = request.get_json(silent=True) or {}
+            callback = app.callback_map.get(body.get("output"), {}).get("callback")
+            name = getattr(callback, "__name__", "unknown")
+            RESPONSE_BYTES.labels(name).observe(response.calculate_content_length() or len(response.get_data()))
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        registry = REGISTRY
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
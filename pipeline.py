@@ -0,0 +1,172 @@
+# Streaming replacement for the Tableau Prep step between the raw scrape (housing.csv) and
+# full_data_cleaned_and_outliers_removed.csv. Listings flow one at a time through generator
+# stages: parse -> validate -> normalize -> derive €/m² -> remove outliers -> write.
+#
+# Outliers are removed per house type by €/m², with fences from quartiles estimated on a
+# log-binned histogram (bounded memory, ~0.5 % relative error). The quartiles need the whole
+# stream, so the normalized rows are spooled to a temporary file on the first pass and filtered
+# on the second one.
+#
+# Usage: python pipeline.py [--input housing.csv | --scrape] [--output ...] [--compile compiled]
+import argparse
+import csv
+import datetime
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from dataset import REGION_NAMES, TYPE_NAMES, compile_dataset
+
+COLUMNS = ['Title', 'Rooms', 'Price', 'Size', 'Type', 'Year', 'Location']
+VALID_ROOMS = {f"{n}H" for n in range(1, 7)}
+MIN_PRICE, MAX_PRICE = 5000, 999999
+MIN_SIZE, MAX_SIZE = 20, 300
+MIN_YEAR = 1900
+
+
+# *** Sources ***
+def read_rows(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        yield from csv.DictReader(f)
+
+# Listings as the scraper's pages arrive, see scrape.iter_pages for the options
+def scraped_rows(**scrape_options):
+    from scrape import iter_pages
+    for page_num, listings, error in iter_pages(**scrape_options):
+        if error is not None:
+            print(f"Page {page_num} failed: {error}", file=sys.stderr)
+            continue
+        for _, row in listings:
+            yield dict(zip(COLUMNS, row))
+
+# *** Stages ***
+def _to_int(value):
+    try:
+        return int(float(str(value).replace(" ", "")))
+    except ValueError:
+        return None
+
+# Drop listings with missing fields or values outside plausible ranges
+def validate(rows, max_year=None):
+    max_year = max_year or datetime.date.today().year + 2
+    for row in rows:
+        price, size, year = _to_int(row.get('Price', '')), _to_int(row.get('Size', '')), _to_int(row.get('Year', ''))
+        if price is None or size is None or year is None:
+            continue
+        if not (MIN_PRICE <= price <= MAX_PRICE and MIN_SIZE <= size <= MAX_SIZE and MIN_YEAR <= year <= max_year):
+            continue
+        if not row.get('Rooms') or not row.get('Type') or not row.get('Location'):
+            continue
+        yield dict(row, Price=price, Size=size, Year=year)
+
+# Canonical room count (1H-6H), house type and region names, unknown values are dropped
+def normalize(rows):
+    for row in rows:
+        rooms = row['Rooms'].strip().upper()
+        house_type = row['Type'].strip().capitalize()
+        location = row['Location'].strip()
+        if rooms not in VALID_ROOMS or house_type not in TYPE_NAMES:
+            continue
+        if location not in REGION_NAMES and location != "Ahvenanmaa":
+            continue
+        yield dict(row, Title=row['Title'].strip(), Rooms=rooms, Type=house_type, Location=location)
+
+def derive(rows):
+    for row in rows:
+        row['Price_M2'] = row['Price'] / row['Size']
+        yield row
+
+# Quantiles of a stream of positive values from a log-binned histogram
+class QuantileSketch:
+    def __init__(self, low=1.0, high=1e6, bins=3000):
+        self.log_low = math.log(low)
+        self.scale = bins / (math.log(high) - self.log_low)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.n = 0
+
+    def add(self, value):
+        index = int((math.log(max(value, 1e-9)) - self.log_low) * self.scale)
+        self.counts[min(max(index, 0), len(self.counts) - 1)] += 1
+        self.n += 1
+
+    # Bounds of the bin, the first and last bins also hold every value below / above the range
+    def _edges(self, index):
+        lower = math.exp(self.log_low + index / self.scale) if index > 0 else 0.0
+        upper = math.exp(self.log_low + (index + 1) / self.scale) if index < len(self.counts) - 1 else math.inf
+        return lower, upper
+
+    # (low, high) surely holding the exact quantile (linear interpolation, as np.quantile): the
+    # lower edge of the bin of its lower order statistic and the upper edge of the bin of its upper one
+    def quantile_bounds(self, q):
+        cumulative = np.cumsum(self.counts)
+        position = q * (self.n - 1)
+        lower = int(np.searchsorted(cumulative, math.floor(position), side="right"))
+        upper = int(np.searchsorted(cumulative, math.ceil(position), side="right"))
+        return self._edges(lower)[0], self._edges(upper)[1]
+
+# Keep listings whose €/m² is within k * IQR of the quartiles of their house type. The sketch only
+# bounds the quartiles, so the fences are widened to the widest IQR those bounds allow: a listing
+# inside the exact fences is never removed, one just outside them may be kept.
+def remove_outliers(rows, k=3.0, spool_dir=None):
+    sketches = {}
+    with tempfile.TemporaryFile("w+", encoding="utf8", newline="", dir=spool_dir) as spool:
+        spool_write = csv.writer(spool)
+        for row in rows:
+            sketches.setdefault(row['Type'], QuantileSketch()).add(row['Price_M2'])
+            spool_write.writerow([row[column] for column in COLUMNS])
+        fences = {}
+        for house_type, sketch in sketches.items():
+            q1_low, _ = sketch.quantile_bounds(0.25)
+            _, q3_high = sketch.quantile_bounds(0.75)
+            iqr = q3_high - q1_low
+            # Bin edges are computed with exp(), a value on an edge may land a rounding error outside
+            fences[house_type] = ((q1_low - k * iqr) * (1 - 1e-9), (q3_high + k * iqr) * (1 + 1e-9))
+        spool.seek(0)
+        for values in csv.reader(spool):
+            row = dict(zip(COLUMNS, values))
+            low, high = fences[row['Type']]
+            if low <= int(row['Price']) / int(row['Size']) <= high:
+                yield row
+
+def write_rows(rows, path):
+    count = 0
+    with open(path, 'w', encoding='utf8', newline='') as f:
+        file_write = csv.writer(f)
+        file_write.writerow(COLUMNS)
+        for row in rows:
+            file_write.writerow([row[column] for column in COLUMNS])
+            count += 1
+    return count
+
+def run(rows, output, outlier_k=3.0):
+    return write_rows(remove_outliers(derive(normalize(validate(rows))), k=outlier_k), output)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean scraped listings into the dataset used by app.py")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--input", default="housing.csv", help="raw scrape .csv")
+    source.add_argument("--scrape", action="store_true", help="clean the listings while they are being scraped")
+    parser.add_argument("--first-page", type=int, default=1)
+    parser.add_argument("--last-page", type=int, default=314)
+    parser.add_argument("--output", default="full_data_cleaned_and_outliers_removed.csv")
+    parser.add_argument("--outlier-k", type=float, default=3.0, help="IQR multiplier of the €/m² outlier fences")
+    parser.add_argument("--compile", metavar="DIR", help="also compile the output to the artifact loaded by app.py")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.scrape:
+        rows = scraped_rows(first_page=args.first_page, last_page=args.last_page)
+    else:
+        rows = read_rows(args.input)
+    # Write to a temporary file first, so a failed run doesn't leave a truncated dataset behind
+    partial = args.output + ".partial"
+    count = run(rows, partial, args.outlier_k)
+    os.replace(partial, args.output)
+    print(f"Wrote {count} listings to {args.output}")
+    if args.compile:
+        manifest = compile_dataset(args.output, args.compile)
+        print(f"Compiled {manifest['rows']} listings to {args.compile}")
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# Candidate rows that still need sorting (a range slice, several category values) are only
+# used when they are at most 1/SPARSE_RANGE of the rows, wider selections scan the columns
+SPARSE_RANGE = 16
+# Category selections of up to this many values are matched by comparing the codes
+MAX_COMPARED_CODES = 4
+
+
+# Query engine over the listings frame, built once at startup.
+# Range columns keep their values sorted together with the original row order, so a
+# [low, high] filter is two binary searches giving a slice of row positions. Categorical columns
+# keep their codes and, per value, the ascending positions of its rows. A query starts from the
+# narrowest filter's rows and checks only those against the other filters; when no filter is
+# narrow enough it ANDs one mask per active filter over the columns instead. It returns the
+# matching row positions, the frame itself is never copied.
+class QueryEngine:
+    def __init__(self, frame, range_columns=("Year", "Price", "Size"),
+                 categorical_columns=("Type", "Location", "Rooms")):
+        self.size = len(frame)
+        # Row positions fit in 32 bits for any realistic dataset, halving the index size
+        position_dtype = np.uint32 if self.size < 2**32 else np.int64
+        self._values = {}
+        self._order = {}
+        self._sorted = {}
+        for column in range_columns:
+            values = frame[column].to_numpy()
+            order = np.argsort(values, kind="stable").astype(position_dtype)
+            self._values[column] = values
+            self._order[column] = order
+            self._sorted[column] = values[order]
+        self._codes = {}
+        self._code_of = {}
+        self._rows = {}
+        self._offsets = {}
+        for column in categorical_columns:
+            codes, uniques = pd.factorize(frame[column])
+            self._codes[column] = codes.astype(np.int16 if len(uniques) < 2**15 else np.int32)
+            self._code_of[column] = {value: code for code, value in enumerate(uniques)}
+            # Rows grouped by code (missing values, code -1, first), ascending within a code
+            self._rows[column] = np.argsort(codes, kind="stable").astype(position_dtype)
+            self._offsets[column] = np.searchsorted(codes[self._rows[column]], np.arange(len(uniques) + 1))
+
+    # The bound as a scalar of the column dtype, clamped to its range. searchsorted would otherwise
+    # cast the whole sorted column to a common dtype on every call.
+    @staticmethod
+    def _key(dtype, value):
+        if dtype.kind in "iu":
+            info = np.iinfo(dtype)
+            value = min(max(value, info.min), info.max)
+        return dtype.type(value)
+
+    # (start, stop) of the rows with low <= value <= high in the sorted order and the bounds in the
+    # column dtype, None when the range covers every row
+    def range_span(self, column, low, high):
+        sorted_values = self._sorted[column]
+        low, high = self._key(sorted_values.dtype, low), self._key(sorted_values.dtype, high)
+        start = np.searchsorted(sorted_values, low, side="left")
+        stop = np.searchsorted(sorted_values, high, side="right")
+        if start == 0 and stop == self.size:
+            return None
+        return start, stop, low, high
+
+    # Codes of the selected values, None when nothing is selected
+    def category_codes(self, column, values):
+        if not values:
+            return None
+        code_of = self._code_of[column]
+        return [code_of[value] for value in values if value in code_of]
+
+    # Number of rows of the selected codes
+    def _category_count(self, column, selected):
+        offsets = self._offsets[column]
+        return sum(int(offsets[code + 1] - offsets[code]) for code in selected)
+
+    # Which of the given codes are selected. A few selected values are compared one by one, more
+    # go through a lookup table; missing values (code -1) read its last entry, which stays False.
+    @staticmethod
+    def _selected(codes, selected, categories):
+        if len(selected) <= MAX_COMPARED_CODES:
+            mask = np.zeros(len(codes), dtype=bool)
+            for code in selected:
+                mask |= codes == code
+            return mask
+        table = np.zeros(categories + 1, dtype=bool)
+        table[selected] = True
+        return np.take(table, codes)
+
+    # Active filters as (rows, kind, column, arguments), kind "range" or "category"
+    def _filters(self, ranges, categories):
+        filters = []
+        for column, (low, high) in (ranges or {}).items():
+            span = self.range_span(column, low, high)
+            if span is not None:
+                filters.append((span[1] - span[0], "range", column, span))
+        for column, values in (categories or {}).items():
+            selected = self.category_codes(column, values)
+            if selected is not None:
+                filters.append((self._category_count(column, selected), "category", column, selected))
+        return filters
+
+    def _mask(self, filters):
+        mask = np.ones(self.size, dtype=bool)
+        part = np.empty(self.size, dtype=bool)
+        for _, kind, column, arguments in filters:
+            if kind == "range":
+                values = self._values[column]
+                mask &= np.greater_equal(values, arguments[2], out=part)
+                mask &= np.less_equal(values, arguments[3], out=part)
+            else:
+                mask &= self._selected(self._codes[column], arguments, len(self._code_of[column]))
+        return mask
+
+    # Ascending rows of a filter. Those of a single category value are stored ascending, so they
+    # need no sorting however many there are.
+    def _candidates(self, kind, column, arguments):
+        if kind == "range":
+            start, stop, _, _ = arguments
+            return np.sort(self._order[column][start:stop])
+        rows, offsets = self._rows[column], self._offsets[column]
+        if len(arguments) == 1:
+            return rows[offsets[arguments[0]]:offsets[arguments[0] + 1]]
+        return np.sort(np.concatenate([rows[offsets[code]:offsets[code + 1]] for code in arguments]))
+
+    # Boolean row mask for the given filters
+    def mask(self, ranges=None, categories=None):
+        return self._mask(self._filters(ranges, categories))
+
+    # Ascending row positions (usable with DataFrame.iloc) matching the given filters
+    def query(self, ranges=None, categories=None):
+        filters = self._filters(ranges, categories)
+        if not filters:
+            return np.arange(self.size)
+        # A selection of values none of which are in the data (e.g. the dropdown options of a
+        # page loaded before a reload) matches nothing
+        if any(kind == "category" and not arguments for _, kind, _, arguments in filters):
+            return np.empty(0, dtype=np.intp)
+        usable = [f for f in filters if f[0] * SPARSE_RANGE <= self.size or (f[1] == "category" and len(f[3]) == 1)]
+        if not usable:
+            return np.flatnonzero(self._mask(filters))
+        narrowest = min(usable, key=lambda f: f[0])
+        rows = self._candidates(*narrowest[1:])
+        # The other filters narrowest first, so each one checks as few rows as possible
+        for f in sorted(filters, key=lambda f: f[0]):
+            if f is narrowest:
+                continue
+            _, kind, column, arguments = f
+            if kind == "range":
+                values = self._values[column][rows]
+                rows = rows[(values >= arguments[2]) & (values <= arguments[3])]
+            else:
+                rows = rows[self._selected(self._codes[column][rows], arguments, len(self._code_of[column]))]
+        return rows.astype(np.intp)
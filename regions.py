@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import sys
+from functools import lru_cache
+
+from flask import Response, send_from_directory
+
+# Simplified region geometry, built offline with `python regions.py` and served as static files
+GEOMETRY_DIR = "region-geometry"
+# Max zoom -> (simplification tolerance in degrees, coordinate decimals). The tolerance is about
+# half a pixel at that zoom and the coordinates are quantized to a grid below the tolerance.
+GEOMETRY_LEVELS = {5: (0.02, 2), 7: (0.005, 3), 18: (0.001, 4)}
+
+
+# Region geometry is parsed once per process, only the name is kept from the properties
+@lru_cache(maxsize=None)
+def load_regions(path="Finland.json"):
+    with open(path, encoding="utf8") as f:
+        finland = json.load(f)
+    return tuple(
+        {"type": "Feature", "geometry": feature["geometry"], "name": feature["properties"]["name"]}
+        for feature in finland["features"]
+    )
+
+# stats holds listing_count and median_price per region, see aggregate.summarize.
+# Only these per-region numbers are pushed to the map on every update, the geometry is loaded once
+# by the browser and styled from these (see regionStyle & regionTooltip in assets/script.js)
+def region_hideout(stats):
+    counts = {name: int(count) for name, count in stats["listing_count"].items() if count > 0}
+    medians = {name: f"{int(median)} €" for name, median in stats["median_price"].round(0).items() if name in counts}
+    return {"counts": counts, "medians": medians, "max_count": max(counts.values(), default=0)}
+
+def _quantize(coordinates, decimals):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(coordinates[0], decimals), round(coordinates[1], decimals)]
+    points = [_quantize(c, decimals) for c in coordinates]
+    if isinstance(coordinates[0][0], (int, float)):
+        # Drop points that collapsed onto the previous one
+        points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+    return points
+
+# Write a simplified & quantized copy of the regions for every level plus a manifest. File names
+# carry a hash of the content, so the files can be cached by browsers indefinitely.
+def build_geometry(path="Finland.json", out_dir=GEOMETRY_DIR, levels=GEOMETRY_LEVELS):
+    from shapely.geometry import mapping, shape
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"source": os.path.basename(path), "levels": []}
+    for max_zoom, (tolerance, decimals) in sorted(levels.items()):
+        features = []
+        for region in load_regions(path):
+            geometry = mapping(shape(region["geometry"]).simplify(tolerance, preserve_topology=True))
+            features.append({"type": "Feature", "properties": {"name": region["name"]},
+                             "geometry": {"type": geometry["type"], "coordinates": _quantize(geometry["coordinates"], decimals)}})
+        data = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode("utf8")
+        name = f"regions-z{max_zoom}-{hashlib.sha1(data).hexdigest()[:10]}.json"
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+        manifest["levels"].append({"max_zoom": max_zoom, "file": name, "bytes": len(data)})
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+# [(max_zoom, url)] of the built levels. Without a build the full geometry is served as one level.
+@lru_cache(maxsize=None)
+def geometry_levels(out_dir=GEOMETRY_DIR):
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), encoding="utf8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return ((None, "/region-geometry/full.json"),)
+    return tuple((level["max_zoom"], f"/region-geometry/{level['file']}") for level in manifest["levels"])
+
+# Url of the level for a zoom, assets/script.js picks the level the same way
+def geometry_url(zoom, out_dir=GEOMETRY_DIR):
+    levels = geometry_levels(out_dir)
+    return next((url for max_zoom, url in levels if max_zoom is not None and zoom <= max_zoom), levels[-1][1])
+
+@lru_cache(maxsize=None)
+def _full_geometry(path):
+    features = [{"type": "Feature", "properties": {"name": region["name"]}, "geometry": region["geometry"]}
+                for region in load_regions(path)]
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"))
+
+# Registers the route serving the geometry files. Their names change with the content, so they are
+# cached for a year.
+def init_app(app, path="Finland.json", out_dir=GEOMETRY_DIR):
+    @app.server.route("/region-geometry/<name>")
+    def region_geometry(name):
+        if name == "full.json":
+            return Response(_full_geometry(path), content_type="application/json")
+        return send_from_directory(os.path.abspath(out_dir), name, max_age=365 * 24 * 3600)
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "Finland.json"
+    manifest = build_geometry(path, *sys.argv[2:3])
+    print(f"Full geometry: {os.path.getsize(path)} bytes")
+    for level in manifest["levels"]:
+        print(f"Zoom <= {level['max_zoom']}: {level['file']} ({level['bytes']} bytes)")
@@ -1,58 +1,255 @@
-from email import header
-from bs4 import BeautifulSoup
-import requests, string
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from csv import writer
-import re 
-
-# *** Scrape the first <page_num>-1 pages, append results to existing housing.csv file ***
-page_num = 1
-while page_num != 315:
-    url = f"https://www.tori.fi/koko_suomi/asunnot/myytavat_asunnot?ca=18&cg=1010&c=1012&w=3&o={page_num}"
-    page = requests.get(url)
-    soup = BeautifulSoup(page.content, 'html.parser')
-    lists = soup.find_all('a', class_="item_row_flex")
-    
-    with open('housing.csv', 'a', encoding='utf8', newline='') as f:
-        file_write = writer(f)
-        if page_num == 1:
-            header = ['Title', 'Rooms', 'Price', 'Size', 'Type', 'Year', 'Location']
-            file_write.writerow(header)
-        for list in lists:
-            title = list.find('div', class_="li-title").text.translate(str.maketrans('', '', string.punctuation))
-            price = list.find('p', class_="list_price").text.replace(' €', '').replace(" ", "")
-
-            location = list.find('div', attrs={"class":["cat_geo", "cat_geo clean_links"]})
-            location = location.find('p').text 
-
-            # Contains the parse that has info about size, house_type and year
-            list_container = list.find('div', attrs={"class":["list-details-container"]})
-            list_container = str(list_container.find('p', attrs={"class":["param"]}))
-
-            size_parse = re.findall(r"\d{2,5}" ,list_container[list_container.find(">")+1:list_container.find('m²')+2])
-            size = ""
-            if len(size_parse) > 0:
-                size = size_parse[0]
-
-            house_type = ""
-            house_types = ["Rivitalo", "Kerrostalo", "Omakotitalo", "Luhtitalo"]
-            for w in house_types:
-                if w in list_container:
-                    house_type = w
-
-            year = ""
-            year_parse = re.findall(r'\d{4}', list_container)
-            if len(year_parse) > 0:
-                year = year_parse[0]
-
-            rooms_parse = re.findall(r'\d[hH]', title)
-            rooms = ""
-            if len(rooms_parse) > 0:
-                rooms = str(rooms_parse[0]).replace("h", "H")
-
-            info = [title, rooms, price, size, house_type, year, location.strip()]
-            file_write.writerow(info)
-            
-    page_num += 1
\ No newline at end of file
+from bs4 import BeautifulSoup, SoupStrainer
+import requests, string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from csv import writer
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from listing_store import ListingStore
+
+URL_TEMPLATE = "https://www.tori.fi/koko_suomi/asunnot/myytavat_asunnot?ca=18&cg=1010&c=1012&w=3&o={page}"
+HEADER = ['Title', 'Rooms', 'Price', 'Size', 'Type', 'Year', 'Location']
+HOUSE_TYPES = ["Rivitalo", "Kerrostalo", "Omakotitalo", "Luhtitalo"]
+
+def parse_listing(list):
+    title = list.find('div', class_="li-title").text.translate(str.maketrans('', '', string.punctuation))
+    price = list.find('p', class_="list_price").text.replace(' €', '').replace(" ", "")
+
+    location = list.find('div', attrs={"class":["cat_geo", "cat_geo clean_links"]})
+    location = location.find('p').text
+
+    # Contains the parse that has info about size, house_type and year
+    list_container = list.find('div', attrs={"class":["list-details-container"]})
+    list_container = str(list_container.find('p', attrs={"class":["param"]}))
+
+    size_parse = re.findall(r"\d{2,5}" ,list_container[list_container.find(">")+1:list_container.find('m²')+2])
+    size = ""
+    if len(size_parse) > 0:
+        size = size_parse[0]
+
+    house_type = ""
+    for w in HOUSE_TYPES:
+        if w in list_container:
+            house_type = w
+
+    year = ""
+    year_parse = re.findall(r'\d{4}', list_container)
+    if len(year_parse) > 0:
+        year = year_parse[0]
+
+    rooms_parse = re.findall(r'\d[hH]', title)
+    rooms = ""
+    if len(rooms_parse) > 0:
+        rooms = str(rooms_parse[0]).replace("h", "H")
+
+    return [title, rooms, price, size, house_type, year, location.strip()]
+
+# High-throughput variant of parse_listing with identical output: precompiled patterns and a
+# single scan for the house type (the last matching type in HOUSE_TYPES wins, as above)
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+SIZE_RE = re.compile(r"\d{2,5}")
+YEAR_RE = re.compile(r"\d{4}")
+ROOMS_RE = re.compile(r"\d[hH]")
+HOUSE_TYPES_LAST_FIRST = HOUSE_TYPES[::-1]
+
+def parse_listing_fast(list):
+    title = list.find('div', class_="li-title").text.translate(PUNCTUATION)
+    price = list.find('p', class_="list_price").text.replace(' €', '').replace(" ", "")
+    location = list.find('div', attrs={"class":["cat_geo", "cat_geo clean_links"]}).find('p').text
+
+    list_container = str(list.find('div', attrs={"class":["list-details-container"]}).find('p', attrs={"class":["param"]}))
+    size_match = SIZE_RE.search(list_container, list_container.find(">")+1, list_container.find('m²')+2)
+    year_match = YEAR_RE.search(list_container)
+    rooms_match = ROOMS_RE.search(title)
+    house_type = next((w for w in HOUSE_TYPES_LAST_FIRST if w in list_container), "")
+
+    return [title,
+            rooms_match.group(0).replace("h", "H") if rooms_match else "",
+            price,
+            size_match.group(0) if size_match else "",
+            house_type,
+            year_match.group(0) if year_match else "",
+            location.strip()]
+
+# Stable listing id, the number at the end of the listing URL (.../Kaksio_Helsinki_95678123.htm?ca=18)
+def listing_id(list):
+    href = list.get('href', '')
+    match = re.search(r'(\d+)\.htm', href)
+    return match.group(1) if match else urlsplit(href).path
+
+# (listing_id, row) pairs for every listing on a result page
+def parse_page(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    return [(listing_id(list), parse_listing(list)) for list in soup.find_all('a', class_="item_row_flex")]
+
+try:
+    import lxml
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+LISTING_ROWS = SoupStrainer('a', class_="item_row_flex")
+
+# Builds a tree of the listing rows only, with lxml when it is installed
+def parse_page_fast(content):
+    soup = BeautifulSoup(content, FAST_PARSER, parse_only=LISTING_ROWS)
+    return [(listing_id(list), parse_listing_fast(list)) for list in soup.find_all('a', class_="item_row_flex")]
+
+PARSE_MODES = {"default": parse_page, "fast": parse_page_fast}
+
+# Spaces out requests to the same host to at most <rate> per second, shared by all threads
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if self.interval == 0:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+# Pooled session, failed requests (connection errors, 429 & 5xx) are retried with exponential backoff
+def make_session(concurrency, retries, backoff):
+    retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["GET"], respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch_page(session, limiter, url, timeout):
+    limiter.wait(url)
+    page = session.get(url, timeout=timeout)
+    page.raise_for_status()
+    return page.content
+
+# Yields (page_num, listings, error) for pages <first_page>..<last_page> in page order, as they arrive.
+# Pages are fetched and parsed concurrently, one window of <concurrency> pages at a time, so a
+# consumer that stops early doesn't make the crawl run far past it.
+def iter_pages(first_page=1, last_page=314, concurrency=8, rate=4.0, retries=3, backoff=0.5, timeout=15,
+               url_template=URL_TEMPLATE, parse_mode="default", save_pages=None):
+    session = make_session(concurrency, retries, backoff)
+    limiter = RateLimiter(rate)
+    parse = PARSE_MODES[parse_mode]
+    if save_pages:
+        os.makedirs(save_pages, exist_ok=True)
+
+    def fetch_and_parse(page_num):
+        try:
+            content = fetch_page(session, limiter, url_template.format(page=page_num), timeout)
+            if save_pages:
+                with open(os.path.join(save_pages, f"page-{page_num}.html"), 'wb') as page_file:
+                    page_file.write(content)
+            return page_num, parse(content), None
+        except Exception as e:
+            return page_num, [], e
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for window_start in range(first_page, last_page + 1, concurrency):
+            pages = range(window_start, min(window_start + concurrency, last_page + 1))
+            yield from pool.map(fetch_and_parse, pages)
+
+# *** Scrape pages <first_page>..<last_page>, append results to the output .csv file ***
+# The rows are written by a single writer in page order. A page that still fails after the
+# retries is reported and skipped instead of stopping the run.
+# With a store the listings are upserted into it instead and the progress is checkpointed after
+# every page up to the first failed one, resume continues from the checkpoint of an interrupted
+# run or a run with failed pages. In incremental mode the crawl stops at the first page without
+# any new listings.
+def scrape(first_page=1, last_page=314, output="housing.csv", concurrency=8, rate=4.0, retries=3,
+           backoff=0.5, timeout=15, url_template=URL_TEMPLATE, store=None, incremental=False, resume=False,
+           parse_mode="default", save_pages=None):
+    if store is not None and resume and store.checkpoint() is not None:
+        first_page = store.checkpoint() + 1
+
+    failed = []
+    rows_written = 0
+    f = None
+    if store is None:
+        write_header = not os.path.exists(output) or os.path.getsize(output) == 0
+        f = open(output, 'a', encoding='utf8', newline='', buffering=1024 * 1024)
+        file_write = writer(f)
+        if write_header:
+            file_write.writerow(HEADER)
+    pages = iter_pages(first_page, last_page, concurrency, rate, retries, backoff, timeout, url_template,
+                       parse_mode, save_pages)
+    try:
+        for page_num, listings, error in pages:
+            if error is not None:
+                print(f"Page {page_num} failed: {error}", file=sys.stderr)
+                failed.append(page_num)
+                continue
+            if store is None:
+                file_write.writerows(row for _, row in listings)
+                rows_written += len(listings)
+                continue
+            new_ids = {id for id, _ in listings} - store.known(id for id, _ in listings)
+            store.upsert(listings)
+            # The checkpoint never moves past a failed page, resume retries it
+            if failed:
+                store.commit()
+            else:
+                store.save_checkpoint(page_num)
+            rows_written += len(new_ids)
+            if incremental and listings and not new_ids:
+                break
+        if store is not None and not failed:
+            store.clear_checkpoint()
+    finally:
+        pages.close()
+        if f is not None:
+            f.close()
+    return rows_written, failed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape housing listings from Tori.fi to a .csv file")
+    parser.add_argument("--first-page", type=int, default=1)
+    parser.add_argument("--last-page", type=int, default=314)
+    parser.add_argument("--output", default="housing.csv")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel requests")
+    parser.add_argument("--rate", type=float, default=4.0, help="max requests per second per host, 0 disables the limit")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="backoff factor between retries, in seconds")
+    parser.add_argument("--timeout", type=float, default=15)
+    parser.add_argument("--url-template", default=URL_TEMPLATE,
+                        help="page URL with a {page} placeholder, e.g. a local stub server serving saved pages")
+    parser.add_argument("--store", help="upsert listings into this SQLite store instead of appending to --output")
+    parser.add_argument("--incremental", action="store_true", help="stop at the first page without new listings (needs --store)")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted crawl from its checkpoint (needs --store)")
+    parser.add_argument("--parse-mode", choices=sorted(PARSE_MODES), default="default",
+                        help="'fast' parses only the listing rows, with lxml when available; check it with benchmarks/parse_benchmark.py first")
+    parser.add_argument("--save-pages", help="also save the fetched pages to this folder, e.g. as parser fixtures")
+    parser.add_argument("--export", help="write the listings of --store to this .csv file after the crawl")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if (args.incremental or args.resume or args.export) and not args.store:
+        sys.exit("--incremental, --resume and --export need --store")
+    store = ListingStore(args.store) if args.store else None
+    rows_written, failed = scrape(args.first_page, args.last_page, args.output, args.concurrency, args.rate,
+                                  args.retries, args.backoff, args.timeout, args.url_template,
+                                  store, args.incremental, args.resume, args.parse_mode, args.save_pages)
+    if store is not None:
+        print(f"Stored {rows_written} new listings in {args.store} ({store.count()} in total)")
+        if args.export:
+            store.export_csv(args.export)
+        store.close()
+    else:
+        print(f"Wrote {rows_written} listings to {args.output}")
+    if failed:
+        print(f"Failed pages: {', '.join(map(str, failed))}", file=sys.stderr)
+        sys.exit(1)
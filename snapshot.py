@@ -0,0 +1,67 @@
+import math
+import sys
+import threading
+import time
+
+import numpy as np
+
+from cube import CUBE_EXACT_LIMIT, AggregateCube
+from dataset import dataset_version, load_listings, load_title_index
+from query import QueryEngine
+
+
+# Everything derived from one version of the dataset: the listings, their indexes, the layout
+# options and the full dataset figures the key figures are compared to. The app replaces the
+# whole snapshot at once when a new dataset is published, a callback keeps using the snapshot
+# it started with.
+class Snapshot:
+    def __init__(self, df, version, title_index=None):
+        self.df = df
+        self.version = version
+        self.engine = QueryEngine(df)
+        # Title search, see title_index.py. None when the titles aren't available.
+        self.title_index = title_index
+        # Large datasets are summarized from the aggregate cube, small ones always from their rows
+        self.cube = AggregateCube(df) if len(df) > CUBE_EXACT_LIMIT else None
+
+        # Support variables for callback functions
+        self.housing_types = np.sort(df["Type"].unique())
+        self.locations = np.sort(df["Location"].unique())
+        self.rooms = np.sort(df["Rooms"].unique())
+        self.bounds = {column: (int(df[column].min()), int(df[column].max())) for column in ["Price", "Year", "Size"]}
+
+        # Dataset figures
+        self.ttl_median_size = math.floor(df.Size.mean())
+        self.ttl_median_euro_m2 = math.floor(df["Price_M2"].median())
+        self.ttl_median_year = math.floor(df.Year.median())
+        self.ttl_cheapest_listing = df.Price.min()
+        self.ttl_most_expensive_listing = df.Price.max()
+        self.ttl_median_price = df.Price.median()
+
+def load_snapshot(csv_path, artifact_dir):
+    df, version = load_listings(csv_path, artifact_dir)
+    return Snapshot(df, version, load_title_index(version, csv_path, artifact_dir))
+
+# Polls the dataset version every <interval> seconds. A new version is loaded and indexed on this
+# thread, then handed to on_reload, requests keep being served from the old snapshot meanwhile.
+class Reloader(threading.Thread):
+    def __init__(self, csv_path, artifact_dir, version, on_reload, interval=60):
+        super().__init__(name="dataset-reloader", daemon=True)
+        self.csv_path = csv_path
+        self.artifact_dir = artifact_dir
+        self.version = version
+        self.on_reload = on_reload
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                if dataset_version(self.csv_path, self.artifact_dir) == self.version:
+                    continue
+                snapshot = load_snapshot(self.csv_path, self.artifact_dir)
+                self.version = snapshot.version
+                self.on_reload(snapshot)
+                print(f"Reloaded dataset {snapshot.version} ({len(snapshot.df)} listings)", file=sys.stderr)
+            except Exception as e:
+                print(f"Dataset reload failed: {e}", file=sys.stderr)
@@ -0,0 +1,75 @@
+import bisect
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# Lowercase, accents folded (ä -> a, ö -> o) and punctuation stripped, so "Meilahti," and
+# "meilahti" or "Hämeenlinna" and "hameenlinna" are the same token
+def tokenize(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return TOKEN_RE.findall(text)
+
+
+# Inverted index over the title tokens. The vocabulary is sorted, so all tokens starting with a
+# prefix form one contiguous range, and their postings (ascending row positions, grouped by token)
+# form one contiguous slice. A word of the query is two binary searches and a slice, a query of
+# several words is the intersection of its words, i.e. every word has to match the start of a token.
+class TitleIndex:
+    def __init__(self, tokens, offsets, postings):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.postings = postings
+
+    @classmethod
+    def build(cls, titles):
+        rows_of = {}
+        for row, title in enumerate(titles):
+            for token in set(tokenize(title)):
+                rows_of.setdefault(token, []).append(row)
+        tokens = sorted(rows_of)
+        counts = np.array([len(rows_of[token]) for token in tokens], dtype=np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        postings = np.fromiter((row for token in tokens for row in rows_of[token]), dtype=np.uint32,
+                               count=int(offsets[-1]))
+        return cls(tokens, offsets, postings)
+
+    # Files written next to the compiled columns, see dataset.write_artifact
+    def save(self, directory):
+        with open(os.path.join(directory, "TitleTokens.txt"), "w", encoding="utf8") as f:
+            f.writelines(token + "\n" for token in self.tokens)
+        np.save(os.path.join(directory, "TitleOffsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "TitlePostings.npy"), self.postings)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "TitleTokens.txt"), encoding="utf8") as f:
+            tokens = f.read().split("\n")[:-1]
+        return cls(tokens, np.load(os.path.join(directory, "TitleOffsets.npy")),
+                   np.load(os.path.join(directory, "TitlePostings.npy"), mmap_mode="r"))
+
+    # Rows with a token starting with prefix, ascending
+    def prefix_rows(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        stop = bisect.bisect_left(self.tokens, prefix + "\uffff", lo=start)
+        if stop - start == 1:
+            return np.asarray(self.postings[self.offsets[start]:self.offsets[stop]])
+        return np.unique(self.postings[self.offsets[start]:self.offsets[stop]])
+
+    # Rows matching every word of the query, ascending. None for an empty query (no filter).
+    def search(self, query):
+        words = tokenize(query or "")
+        if not words:
+            return None
+        rows = None
+        for word in sorted(set(words), key=len, reverse=True):
+            matches = self.prefix_rows(word)
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+            if len(rows) == 0:
+                break
+        return rows